@@ -0,0 +1,160 @@
+"""
+Асинхронные варианты часто вызываемых GET-запросов для запуска под ASGI (orders.asgi)
+
+Подключаются в orders.urls при ASYNC_VIEWS = 1 вместо представлений DRF: список и карточка
+товара, корзина и заказ. Запросы к БД выполняются через асинхронный ORM (aget, afirst,
+aaggregate, async for), кеш карточек - через асинхронный API кеша, поэтому поток не занят
+на время ожидания. Ответы совпадают с ответами DRF (JSON, ETag, Last-Modified, 304).
+Остальные методы (POST, PATCH, DELETE) передаются синхронным представлениям DRF.
+Курсорная пагинация и фасеты DRF работают только синхронно и выполняются через sync_to_async.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .cache import aget_catalog_version, aget_product_payload
+from .filters import filter_products, get_facets
+from .models import OrderMeta, Product
+from .serializers import BasketSerializer, ProductParameterSerializer
+from .views import ORDER_LINES, ORDERS, BasketViewSet, OrderAPIView, ProductViewSet, catalog_etag, \
+    catalog_last_modified, order_context, order_etag, product_etag, product_modified
+
+
+def _json(data, status=200):
+    # тот же рендерер, что у DRF: Decimal выводится числом, дата - в ISO 8601
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def _not_found():
+    return _json({'detail': 'Not found.'}, status=404)
+
+
+def _error(error):
+    # как exception_handler DRF: сообщение-строка выводится в поле detail
+    detail = error.detail if isinstance(error.detail, (list, dict)) else {'detail': error.detail}
+    return _json(detail, status=error.status_code)
+
+
+def _read_only(sync_view):
+    """
+    Асинхронно обрабатываются GET и HEAD, остальные методы - синхронным представлением DRF
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method in ('GET', 'HEAD'):
+                try:
+                    return await view(request, *args, **kwargs)
+                except APIException as error:
+                    return _error(error)
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        # представления DRF не проверяют CSRF, аутентификация - по токену
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def _conditional(request, render, etag, last_modified):
+    """
+    Ответ 304 при совпадении ETag / Last-Modified, иначе результат render() с этими заголовками,
+    как у django.views.decorators.http.condition
+    """
+    etag = quote_etag(etag) if etag else None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await render()
+        if response.status_code != 200:
+            return response
+        if etag:
+            response.headers.setdefault('ETag', etag)
+        if timestamp:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+    return response
+
+
+@_read_only(ProductViewSet.as_view({'get': 'list'}))
+async def product_list(request):
+    drf_request = Request(request)
+    fields = ProductViewSet.get_fields(drf_request)
+    request.catalog_state = dict(await Product.objects.aaggregate(modified=Max('modified')),
+                                 version=await aget_catalog_version())
+
+    async def render():
+        return await sync_to_async(_render_product_list)(drf_request, fields)
+
+    return await _conditional(request, render, catalog_etag(request), catalog_last_modified(request))
+
+
+def _render_product_list(request, fields):
+    try:
+        queryset = filter_products(ProductViewSet.get_queryset(fields), request.query_params)
+        paginator = ProductViewSet.pagination_class()
+        page = paginator.paginate_queryset(queryset, request)
+        data = paginator.get_paginated_response(ProductParameterSerializer(page, many=True, fields=fields).data).data
+        if request.query_params.get('facets'):
+            data['facets'] = get_facets(queryset)
+    except APIException as error:
+        return _error(error)
+    return _json(data)
+
+
+@_read_only(ProductViewSet.as_view({'get': 'retrieve'}))
+async def product_detail(request, pk):
+    fields = ProductViewSet.get_fields(Request(request))
+    request.product_modified = await Product.objects.filter(pk=pk).values_list('modified', flat=True).afirst()
+    if request.product_modified is None:
+        return _not_found()
+
+    async def arender():
+        product = await ProductViewSet.get_queryset(fields).filter(pk=pk).afirst()
+        return None if product is None else ProductParameterSerializer(product, fields=fields).data
+
+    async def render():
+        payload = await aget_product_payload(pk, request.product_modified, fields, arender)
+        return _not_found() if payload is None else _json(payload)
+
+    return await _conditional(request, render, product_etag(request, pk), product_modified(request, pk))
+
+
+@_read_only(BasketViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def basket_list(request):
+    baskets = [basket async for basket in BasketViewSet.queryset.all()]
+    return _json(BasketSerializer(baskets, many=True).data)
+
+
+@_read_only(OrderAPIView.as_view())
+async def order_detail(request, pk):
+    order_lines = [line async for line in ORDER_LINES.filter(order=pk)]
+    if order_lines:
+        order = order_lines[0].order
+    else:
+        try:
+            order = await ORDERS.aget(pk=pk)
+        except OrderMeta.DoesNotExist:
+            return _not_found()
+
+    etag = order_etag(order)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = _json(order_context(order, order_lines))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+urlpatterns = [
+    path('products/', product_list),
+    path('products/<int:pk>/', product_detail),
+    path('basket/', basket_list),
+    path('order/<int:pk>/', order_detail),
+]
@@ -0,0 +1,154 @@
+"""
+Аутентификация по токену с кешем в памяти процесса
+
+TokenAuthentication DRF на каждый запрос выполняет запрос Token + User к БД. Здесь пара
+(пользователь, токен) хранится в ограниченном LRU-кеше процесса и живет не дольше
+TOKEN_CACHE_TIMEOUT секунд. Удаление токена и изменение или удаление пользователя через ORM
+сбрасывают запись (goods.signals); изменения в других процессах видны после истечения времени жизни.
+
+Ограничение попыток входа: неудачные попытки считаются в кеше Django отдельно для учетной записи
+и для IP-адреса; после исчерпания лимита вход отклоняется до проверки пароля, чтобы перебор
+паролей не загружал процессор хешированием PBKDF2.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """
+    LRU-кеш пар (пользователь, токен) по ключу токена с ограничением размера и времени жизни
+    """
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.keys_by_user = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, token, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+        return _copy(user, token)
+
+    def set(self, key, user, token):
+        user, token = _copy(user, token)
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (user, token, time.monotonic() + self.timeout)
+            self.keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._remove(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for key in list(self.keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self.keys_by_user.get(entry[0].pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_user[entry[0].pk]
+
+
+def _copy(user, token):
+    # каждый запрос получает свои копии, изменения request.user и request.auth не попадают в кеш
+    user, token = copy.copy(user), copy.copy(token)
+    token.user = user
+    return user, token
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TIMEOUT)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, проверяющая токен по кешу процесса и обращающаяся к БД только при промахе
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key) if settings.TOKEN_CACHE_SIZE else None
+        if cached is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if settings.TOKEN_CACHE_SIZE:
+                token_cache.set(key, token.user, token)
+            cached = token.user, token
+
+        user, token = cached
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, token
+
+
+def _account_key(email):
+    # email хешируется: ключ кеша не должен содержать пробелов и управляющих символов
+    return f'login-attempts:account:{hashlib.sha256(str(email).lower().encode()).hexdigest()}'
+
+
+def _attempts_limits(email, ip):
+    return {_account_key(email): settings.LOGIN_ACCOUNT_ATTEMPTS,
+            f'login-attempts:ip:{ip}': settings.LOGIN_IP_ATTEMPTS}
+
+
+def login_blocked(email, ip):
+    """
+    Исчерпан ли лимит неудачных попыток входа для учетной записи или IP-адреса
+    :param email: str - email из запроса
+    :param ip: str - адрес клиента
+    :return: bool
+    """
+    limits = _attempts_limits(email, ip)
+    attempts = cache.get_many(limits.keys())
+    return any(attempts.get(key, 0) >= limit for key, limit in limits.items())
+
+
+def login_failed(email, ip):
+    """
+    Учет неудачной попытки входа; счетчики живут LOGIN_RATE_WINDOW секунд с первой неудачной попытки
+    """
+    for key in _attempts_limits(email, ip):
+        cache.add(key, 0, settings.LOGIN_RATE_WINDOW)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def login_succeeded(email):
+    """
+    Сброс счетчика неудачных попыток учетной записи после успешного входа
+    """
+    cache.delete(_account_key(email))
@@ -0,0 +1,151 @@
+"""
+Кеш карточек товаров
+
+Сериализованная карточка хранится в кеше Django под ключом product:<id>:<modified>:<версия>:<поля>.
+При изменении предложений или параметров товара (импорт прайса, сохранение и удаление
+через ORM/админку, резервирование остатков заказом) версия товара удаляется, при следующем чтении создается новая,
+а записи со старой версией больше не читаются и вытесняются по таймауту.
+
+Версия сбрасывается только в кеше процесса, выполнившего изменение (по умолчанию кеш - LocMemCache),
+поэтому в ключ входит и время изменения товара из БД (Product.modified), то же, что в ETag и Last-Modified:
+другие процессы после изменения не отдают старую карточку с новым ETag.
+
+Версия каталога входит в ETag списка товаров вместе с max(Product.modified): время изменения
+не меняется при удалении товара, поэтому удаление сбрасывает версию каталога.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product
+
+
+CATALOG_VERSION_KEY = 'catalog-version'
+
+STATS_KEYS = {
+    'hits': 'product-cache:hits',
+    'misses': 'product-cache:misses',
+}
+
+
+def get_product_payload(product_id, modified, fields, render):
+    """
+    Карточка товара из кеша или результат render(), сохраненный в кеш
+    :param product_id: int
+    :param modified: datetime - Product.modified, прочитанное для ETag и Last-Modified
+    :param fields: list или None - набор полей из ?fields=
+    :param render: callable - сериализация карточки, вызывается при промахе
+    :return: dict
+    """
+    key = _payload_key(product_id, modified, _get_version(product_id), fields)
+    payload = cache.get(key)
+    if payload is not None:
+        _count('hits')
+        return payload
+
+    _count('misses')
+    payload = render()
+    cache.set(key, payload, settings.PRODUCT_CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_product_payload(product_id, modified, fields, arender):
+    """
+    Асинхронный вариант get_product_payload для представлений под ASGI
+    :param arender: корутинная функция - сериализация карточки, вызывается при промахе
+    """
+    version = await cache.aget_or_set(_version_key(product_id), time.time_ns, None)
+    key = _payload_key(product_id, modified, version, fields)
+    payload = await cache.aget(key)
+    if payload is not None:
+        await _acount('hits')
+        return payload
+
+    await _acount('misses')
+    payload = await arender()
+    await cache.aset(key, payload, settings.PRODUCT_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate_products(product_ids):
+    """
+    Сброс кеша карточек товаров после фиксации текущей транзакции,
+    чтобы до фиксации в кеш не попали старые данные под новой версией
+    :param product_ids: iterable - идентификаторы товаров
+    """
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: cache.delete_many([_version_key(product_id) for product_id in product_ids]))
+
+
+def touch_products(product_ids):
+    """
+    Обновление времени изменения товаров (ETag и Last-Modified каталога) и сброс их карточек
+    :param product_ids: iterable - идентификаторы товаров
+    """
+    product_ids = list(product_ids)
+    Product.objects.filter(pk__in=product_ids).update(modified=timezone.now())
+    invalidate_products(product_ids)
+
+
+def get_catalog_version():
+    """
+    Версия каталога для ETag списка товаров
+    :return: int
+    """
+    return cache.get_or_set(CATALOG_VERSION_KEY, time.time_ns, None)
+
+
+async def aget_catalog_version():
+    return await cache.aget_or_set(CATALOG_VERSION_KEY, time.time_ns, None)
+
+
+def invalidate_catalog():
+    """
+    Сброс версии каталога после фиксации текущей транзакции (удаление товаров)
+    """
+    transaction.on_commit(lambda: cache.delete(CATALOG_VERSION_KEY))
+
+
+def get_stats():
+    """
+    Счетчики попаданий и промахов кеша карточек
+    :return: dict
+    """
+    values = cache.get_many(STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total, 3) if total else 0
+    return stats
+
+
+def _payload_key(product_id, modified, version, fields):
+    return f"product:{product_id}:{modified.timestamp() if modified else ''}:{version}:{','.join(fields or ['*'])}"
+
+
+def _version_key(product_id):
+    return f'product-version:{product_id}'
+
+
+def _get_version(product_id):
+    # новая версия - текущее время, поэтому она не совпадает ни с одной из прежних
+    return cache.get_or_set(_version_key(product_id), time.time_ns, None)
+
+
+def _count(name):
+    cache.add(STATS_KEYS[name], 0, None)
+    try:
+        cache.incr(STATS_KEYS[name])
+    except ValueError:
+        pass
+
+
+async def _acount(name):
+    await cache.aadd(STATS_KEYS[name], 0, None)
+    try:
+        await cache.aincr(STATS_KEYS[name])
+    except ValueError:
+        pass
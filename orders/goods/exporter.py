@@ -0,0 +1,119 @@
+"""
+Выгрузка каталога поставщика
+
+Предложения читаются из БД серверным курсором пакетами (iterator(chunk_size=...)), а ответ
+формируется построчно, поэтому выгрузка любого размера идет с постоянным расходом памяти.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+
+import yaml
+from django.conf import settings
+
+from .models import ProductDistributor, ProductParameter
+from .pricelist import chunked
+
+
+EXPORT_FORMATS = {
+    'yaml': 'application/yaml; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+CSV_FIELDS = ['id', 'name', 'price', 'price_rrc', 'quantity', 'parameters']
+
+YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# размер фрагмента ответа, отдаваемого серверу приложений
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+def iter_goods(distributor, chunk_size=None):
+    """
+    Позиции каталога поставщика в формате раздела goods файла shop1.yaml.
+    Строки читаются через values_list без создания экземпляров моделей, параметры
+    подгружаются одним запросом на пакет предложений
+    :return: generator
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    offers = ProductDistributor.objects.filter(distributor=distributor).order_by('id').values_list(
+        'product_id', 'product__name', 'price', 'delivery_price', 'quantity')
+
+    for chunk in chunked(offers.iterator(chunk_size=chunk_size), chunk_size):
+        parameters = defaultdict(dict)
+        for product_id, name, value in ProductParameter.objects.filter(
+                product_name__in=[offer[0] for offer in chunk]).order_by('id').values_list(
+                'product_name_id', 'parameter_name__name', 'value'):
+            parameters[product_id][name] = value
+
+        for product_id, name, price, delivery_price, quantity in chunk:
+            yield {
+                'id': product_id,
+                'name': name,
+                'price': _number(price),
+                'price_rrc': _number(price + delivery_price),
+                'quantity': quantity,
+                'parameters': parameters[product_id],
+            }
+
+
+def _number(value):
+    # цены хранятся в Decimal, в выгрузке - числа, как в исходном прайсе (110000, а не '110000.00')
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+def render_yaml(distributor, goods):
+    yield yaml.dump({'shop': distributor.user.company or str(distributor.user).strip()},
+                    Dumper=YAML_DUMPER, allow_unicode=True)
+    yield 'goods:\n'
+    for item in goods:
+        text = yaml.dump([item], Dumper=YAML_DUMPER, allow_unicode=True, sort_keys=False)
+        yield ''.join(f'  {line}' for line in text.splitlines(keepends=True))
+
+
+def render_jsonl(distributor, goods):
+    for item in goods:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+def render_csv(distributor, goods):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for item in goods:
+        writer.writerow(dict(item, parameters=json.dumps(item['parameters'], ensure_ascii=False)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+RENDERERS = {
+    'yaml': render_yaml,
+    'jsonl': render_jsonl,
+    'csv': render_csv,
+}
+
+
+def render_catalog(distributor, output):
+    """
+    Построчная выгрузка каталога поставщика в выбранном формате
+    :param output: str - ключ EXPORT_FORMATS
+    :return: generator
+    """
+    return _buffered(RENDERERS[output](distributor, iter_goods(distributor)))
+
+
+def _buffered(lines):
+    # объединение строк во фрагменты, чтобы не отправлять каждую позицию отдельной записью в сокет
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,119 @@
+"""
+Фильтрация и фасеты каталога товаров
+
+Параметры запроса:
+    ?search=iphone                          - подстрока в наименовании товара
+    ?distributor=1,2                        - товары указанных поставщиков
+    ?price_min=1000&price_max=50000         - цена предложения поставщика
+    ?param=Цвет=золотистый                  - значение параметра (параметр можно повторять)
+    ?param=Встроенная память (Гб)>=256      - числовое сравнение: >=, <=, >, <, !=
+    ?facets=1                               - добавить в ответ количество товаров по значениям
+"""
+import re
+
+from django.db.models import Case, Count, Exists, FloatField, Max, Min, OuterRef, When
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+
+from .models import ProductDistributor, ProductParameter
+from .pricelist import PriceListError, to_money
+
+
+PARAM_RE = re.compile(r'^(?P<name>.+?)(?P<operator>>=|<=|!=|=|>|<)(?P<value>.*)$')
+NUMBER_RE = r'^-?[0-9]+(\.[0-9]+)?$'
+
+NUMERIC_LOOKUPS = {
+    '>=': 'gte',
+    '<=': 'lte',
+    '>': 'gt',
+    '<': 'lt',
+}
+
+
+def filter_products(queryset, params):
+    """
+    Фильтрация товаров по параметрам запроса
+    :param queryset: QuerySet модели Product
+    :param params: QueryDict
+    :return: QuerySet
+    """
+    if params.get('search'):
+        queryset = queryset.filter(name__icontains=params['search'])
+
+    # условия на поставщика и цену должны выполняться для одного и того же предложения
+    offers = {}
+    if params.get('distributor'):
+        offers['distributor__in'] = _parse_list(params['distributor'], int, 'distributor')
+    if params.get('price_min'):
+        offers['price__gte'] = _parse_money(params['price_min'], 'price_min')
+    if params.get('price_max'):
+        offers['price__lte'] = _parse_money(params['price_max'], 'price_max')
+    if offers:
+        queryset = queryset.filter(Exists(ProductDistributor.objects.filter(product=OuterRef('pk'), **offers)))
+
+    for condition in params.getlist('param'):
+        queryset = queryset.filter(Exists(_parameter_condition(condition)))
+    return queryset
+
+
+def _parameter_condition(condition):
+    match = PARAM_RE.match(condition)
+    if not match:
+        raise ValidationError({'param': f'Incorrect condition: {condition}'})
+    name, operator, value = match.group('name').strip(), match.group('operator'), match.group('value').strip()
+
+    parameters = ProductParameter.objects.filter(product_name=OuterRef('pk'), parameter_name__name=name)
+    if operator == '=':
+        return parameters.filter(value=value)
+    if operator == '!=':
+        return parameters.exclude(value=value)
+
+    # значения параметров хранятся строками: сравниваются только значения, похожие на число
+    number = _parse_number(value, 'param')
+    return parameters.annotate(
+        number=Case(When(value__regex=NUMBER_RE, then=Cast('value', FloatField())), default=None,
+                    output_field=FloatField()),
+    ).filter(**{f'number__{NUMERIC_LOOKUPS[operator]}': number})
+
+
+def get_facets(queryset):
+    """
+    Фасеты по отфильтрованному списку товаров: количество товаров по значениям параметров,
+    по поставщикам и диапазон цен
+    :return: dict
+    """
+    products = queryset.order_by().values('pk')
+
+    parameters = {}
+    for name, value, count in ProductParameter.objects.filter(product_name__in=products).values_list(
+            'parameter_name__name', 'value').annotate(count=Count('product_name', distinct=True)).order_by(
+            'parameter_name__name', 'value'):
+        parameters.setdefault(name, {})[value] = count
+
+    offers = ProductDistributor.objects.filter(product__in=products)
+    distributors = dict(offers.values_list('distributor').annotate(count=Count('product', distinct=True))
+                        .order_by('distributor'))
+    price = offers.aggregate(min=Min('price'), max=Max('price'))
+
+    return {'parameters': parameters, 'distributors': distributors, 'price': price}
+
+
+def _parse_number(value, field):
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError({field: f'Incorrect number: {value}'})
+
+
+def _parse_money(value, field):
+    try:
+        return to_money(value)
+    except PriceListError:
+        raise ValidationError({field: f'Incorrect number: {value}'})
+
+
+def _parse_list(value, cast, field):
+    try:
+        return [cast(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise ValidationError({field: f'Incorrect value: {value}'})
@@ -0,0 +1,382 @@
+"""
+Импорт прайс-листов поставщиков
+
+Вместо построчных get_or_create / delete / create позиции прайса обрабатываются пакетами:
+товары и параметры разрешаются несколькими запросами с IN, а запись выполняется через
+bulk_create / bulk_update (на PostgreSQL - upsert через update_conflicts) в одной транзакции.
+
+Для каждого предложения поставщика хранится хеш содержимого позиции; при повторной загрузке
+прайса записываются только позиции, у которых изменился хеш или отличаются сохраненные цены и количество.
+Предложения, отсутствующие в прайсе, удаляются только по явному запросу (remove_missing).
+
+Для больших выгрузок на PostgreSQL параметры и предложения можно загружать через COPY.
+
+У изменившихся товаров обновляется время изменения (modified), а их кеш карточек
+сбрасывается после фиксации транзакции пакета.
+"""
+import csv
+import io
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidate_products
+from .models import Basket, OrderLine, Product, Parameter, ProductParameter, ProductDistributor
+from .pricelist import PriceListError, chunked, normalize_items
+
+
+def iter_normalized(goods, chunk_size, workers=1):
+    """
+    Нормализация позиций прайса пакетами. При workers > 1 пакеты проверяются и нормализуются
+    параллельно в пуле процессов, порядок пакетов сохраняется
+    :return: generator - списки нормализованных позиций
+    """
+    if workers <= 1:
+        for index, chunk in enumerate(chunked(goods, chunk_size)):
+            yield normalize_items(chunk, index * chunk_size + 1)
+        return
+
+    # процессы запускаются через spawn: дочерним процессам не передаются соединения с БД родителя
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as executor:
+        pending = deque()
+        for index, chunk in enumerate(chunked(goods, chunk_size)):
+            pending.append(executor.submit(normalize_items, chunk, index * chunk_size + 1))
+            # ограничение числа пакетов в работе, чтобы не держать весь прайс в памяти
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def copy_insert(model, fields, rows):
+    """
+    Загрузка строк в таблицу модели через COPY FROM STDIN (только PostgreSQL)
+    :param fields: list - имена полей модели
+    :param rows: iterable - кортежи значений в порядке fields
+    """
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(model._meta.get_field(field).column) for field in fields)
+    with connection.cursor() as cursor:
+        _copy(cursor, qn(model._meta.db_table), columns, rows)
+
+
+def copy_upsert(model, fields, rows, unique_fields, update_fields):
+    """
+    Upsert через COPY во временную таблицу и INSERT ... ON CONFLICT DO UPDATE (только PostgreSQL)
+    """
+    qn = connection.ops.quote_name
+
+    def column(field):
+        return qn(model._meta.get_field(field).column)
+
+    table, temp = qn(model._meta.db_table), qn(f'tmp_{model._meta.db_table}')
+    columns = ', '.join(column(field) for field in fields)
+    updates = ', '.join(f'{column(field)} = EXCLUDED.{column(field)}' for field in update_fields)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMP TABLE {temp} AS SELECT {columns} FROM {table} WITH NO DATA')
+        _copy(cursor, temp, columns, rows)
+        cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {temp} '
+                       f'ON CONFLICT ({", ".join(column(field) for field in unique_fields)}) DO UPDATE SET {updates}')
+        cursor.execute(f'DROP TABLE {temp}')
+
+
+def _fast_delete(queryset):
+    # удаление одним DELETE без выборки объектов и сигналов post_delete: кеш карточек
+    # импорт сбрасывает сам, а ссылки из корзин и строк заказов обнуляются заранее (remove_missing_offers)
+    return queryset._raw_delete(queryset.db)
+
+
+def _copy(cursor, table, columns, rows):
+    # строки в кавычках, чтобы пустая строка не превращалась в NULL
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+class PriceListImporter:
+    """
+    Пакетный импорт прайса одного поставщика
+    """
+
+    def __init__(self, distributor, chunk_size=None, workers=None, remove_missing=False, use_copy=False):
+        """
+        :param distributor: Distributor
+        :param chunk_size: int - количество позиций в пакете
+        :param workers: int - количество процессов для проверки и нормализации позиций
+        :param remove_missing: bool - удалять предложения поставщика, отсутствующие в прайсе;
+            по умолчанию прайс только добавляет и обновляет предложения
+        :param use_copy: bool - загружать новые записи через COPY (действует только на PostgreSQL)
+        """
+        self.distributor = distributor
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.workers = workers or settings.IMPORT_PROCESS_WORKERS
+        self.remove_missing = remove_missing
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'removed': 0,
+                      'seconds': 0, 'rows_per_sec': 0, 'phases': {}}
+        # время этапов: разбор и нормализация, поиск товаров и параметров, запись
+        self.phases = {'parse': 0.0, 'resolve': 0.0, 'write': 0.0}
+        # товары, встреченные в прайсе, и товары, данные которых были изменены
+        self.seen_products = set()
+        self.touched_products = set()
+
+    def run(self, goods, commit_each_chunk=False, on_chunk=None):
+        """
+        Импорт всех позиций прайса
+        :param goods: iterable - позиции из раздела goods
+        :param commit_each_chunk: bool - фиксировать каждый пакет отдельной транзакцией,
+            иначе весь прайс записывается в одной транзакции
+        :param on_chunk: callable - вызывается со статистикой после записи каждого пакета
+            (внутри транзакции пакета)
+        :return: dict - статистика импорта
+        :raises PriceListError: ошибка в позиции прайса или прайс без позиций
+        """
+        started = time.monotonic()
+        batches = self._timed(iter_normalized(goods, self.chunk_size, self.workers), 'parse')
+        if commit_each_chunk:
+            for rows in batches:
+                with transaction.atomic():
+                    self._import_and_report(rows, started, on_chunk)
+        else:
+            with transaction.atomic():
+                for rows in batches:
+                    self._import_and_report(rows, started, on_chunk)
+
+        # пустой прайс - ошибка загрузки, а не распродажа: предложения поставщика не удаляются
+        if not self.stats['rows']:
+            raise PriceListError('Price list has no goods')
+        if self.remove_missing:
+            with transaction.atomic():
+                self.remove_missing_offers()
+
+        self._update_speed(started)
+        return self.stats
+
+    def _import_and_report(self, rows, started, on_chunk):
+        self.import_rows(rows)
+        if on_chunk is not None:
+            self._update_speed(started)
+            on_chunk(self.stats)
+
+    def _update_speed(self, started):
+        seconds = time.monotonic() - started
+        self.stats['seconds'] = round(seconds, 3)
+        self.stats['rows_per_sec'] = round(self.stats['rows'] / seconds) if seconds else self.stats['rows']
+        self.stats['phases'] = {phase: round(value, 3) for phase, value in self.phases.items()}
+
+    def _touch(self, product_ids):
+        # обновление времени изменения товаров
+        now = timezone.now()
+        with self._phase('write'):
+            for chunk in chunked(product_ids, self.chunk_size):
+                Product.objects.filter(id__in=chunk).update(modified=now)
+
+    @contextmanager
+    def _phase(self, phase):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[phase] += time.monotonic() - started
+
+    def _timed(self, iterable, phase):
+        # учет времени, затраченного на получение очередного элемента
+        iterator = iter(iterable)
+        while True:
+            with self._phase(phase):
+                item = next(iterator, None)
+            if item is None:
+                return
+            yield item
+
+    def import_rows(self, normalized):
+        """
+        Запись пакета нормализованных позиций
+        :param normalized: list - результат normalize_items
+        """
+        # при повторе наименования в пакете побеждает последняя позиция, как и при построчной записи
+        rows = {row['name']: row for row in normalized}
+        self.stats['rows'] += len(normalized)
+
+        # не записываются позиции, цены и количество которых совпадают с сохраненными, а хеш параметров -
+        # с сохраненным хешем: цены и остатки меняются и помимо импорта (резервирование заказом, админка),
+        # а при изменении параметров через ORM хеш сбрасывается (goods.signals)
+        with self._phase('resolve'):
+            existing = self._existing_offers(rows)
+        changed = {}
+        for name, row in rows.items():
+            offer = existing.get(name)
+            if offer is not None and offer[1:] == (row['hash'], row['price'], row['delivery_price'], row['quantity']):
+                self.seen_products.add(offer[0])
+                self.stats['unchanged'] += 1
+            else:
+                changed[name] = row
+        if not changed:
+            return
+
+        with self._phase('resolve'):
+            products = {name: existing[name][0] for name in changed if name in existing}
+            products.update(self._resolve_products([name for name in changed if name not in existing]))
+            parameters = self._resolve_parameters(changed)
+        with self._phase('write'):
+            self._write_parameters(changed, products, parameters)
+            self._write_offers(changed, products)
+
+        updated = products.keys() & existing.keys()
+        self.stats['updated'] += len(updated)
+        self.stats['inserted'] += len(changed) - len(updated)
+        self.seen_products.update(products.values())
+        self.touched_products.update(products.values())
+        # у новых товаров modified уже заполнено при создании
+        self._touch([products[name] for name in updated])
+        invalidate_products(products.values())
+
+    def _existing_offers(self, rows):
+        """
+        Сохраненные предложения поставщика по наименованиям товаров пакета
+        :return: dict - {name: (product_id, content_hash, price, delivery_price, quantity)}
+        """
+        offers = {}
+        for product_id, name, *values in ProductDistributor.objects.filter(
+                distributor=self.distributor, product__name__in=rows.keys()).order_by('product_id').values_list(
+                'product_id', 'product__name', 'content_hash', 'price', 'delivery_price', 'quantity'):
+            offers.setdefault(name, (product_id, *values))
+        return offers
+
+    def _resolve_products(self, names):
+        """
+        Получение id товаров по наименованию с созданием недостающих
+        :return: dict - {name: product_id}
+        """
+        products = {}
+        if not names:
+            return products
+        for product_id, name in Product.objects.filter(name__in=names).order_by('id').values_list('id', 'name'):
+            products.setdefault(name, product_id)
+
+        missing = [Product(name=name) for name in names if name not in products]
+        Product.objects.bulk_create(missing, batch_size=self.chunk_size)
+        for product in missing:
+            products[product.name] = product.id
+
+        # на бэкендах без RETURNING id созданных записей нужно перечитать
+        if any(product.id is None for product in missing):
+            for product_id, name in Product.objects.filter(
+                    name__in=[product.name for product in missing]).values_list('id', 'name'):
+                products[name] = product_id
+        return products
+
+    def _resolve_parameters(self, rows):
+        """
+        Получение id параметров по названию с созданием недостающих
+        :return: dict - {name: parameter_id}
+        """
+        names = {name for row in rows.values() for name in row['parameters']}
+        parameters = {}
+        for parameter_id, name in Parameter.objects.filter(name__in=names).order_by('id').values_list('id', 'name'):
+            parameters.setdefault(name, parameter_id)
+
+        missing = [Parameter(name=name) for name in names if name not in parameters]
+        Parameter.objects.bulk_create(missing, batch_size=self.chunk_size)
+        for parameter in missing:
+            parameters[parameter.name] = parameter.id
+
+        if any(parameter.id is None for parameter in missing):
+            for parameter_id, name in Parameter.objects.filter(
+                    name__in=[parameter.name for parameter in missing]).values_list('id', 'name'):
+                parameters[name] = parameter_id
+        return parameters
+
+    def _write_parameters(self, rows, products, parameters):
+        """
+        Приведение записей ProductParameter к параметрам из прайса: удаляются только лишние записи,
+        обновляются только изменившиеся значения
+        """
+        desired = {(products[name], parameters[key]): value
+                   for name, row in rows.items()
+                   for key, value in row['parameters'].items()}
+        stale, changed = [], []
+        for product_parameter in ProductParameter.objects.filter(
+                product_name__in=[products[name] for name in rows]).only('id', 'product_name', 'parameter_name',
+                                                                          'value'):
+            value = desired.pop((product_parameter.product_name_id, product_parameter.parameter_name_id), None)
+            if value is None:
+                stale.append(product_parameter.id)
+            elif value != product_parameter.value:
+                product_parameter.value = value
+                changed.append(product_parameter)
+
+        if stale:
+            _fast_delete(ProductParameter.objects.filter(id__in=stale))
+        ProductParameter.objects.bulk_update(changed, ['value'], batch_size=self.chunk_size)
+        if self.use_copy:
+            copy_insert(ProductParameter, ['product_name', 'parameter_name', 'value'],
+                        ((product_id, parameter_id, value) for (product_id, parameter_id), value in desired.items()))
+            return
+        ProductParameter.objects.bulk_create(
+            [ProductParameter(product_name_id=product_id, parameter_name_id=parameter_id, value=value)
+             for (product_id, parameter_id), value in desired.items()],
+            batch_size=self.chunk_size,
+        )
+
+    def _write_offers(self, rows, products):
+        update_fields = ['price', 'delivery_price', 'quantity', 'content_hash']
+        if self.use_copy:
+            copy_upsert(ProductDistributor, ['product', 'distributor'] + update_fields,
+                        ((products[name], self.distributor.id, row['price'], row['delivery_price'], row['quantity'],
+                          row['hash']) for name, row in rows.items()),
+                        unique_fields=['product', 'distributor'], update_fields=update_fields)
+            return
+
+        offers = [ProductDistributor(product_id=products[name],
+                                     distributor=self.distributor,
+                                     price=row['price'],
+                                     quantity=row['quantity'],
+                                     delivery_price=row['delivery_price'],
+                                     content_hash=row['hash'])
+                  for name, row in rows.items()]
+
+        if connection.features.supports_update_conflicts_with_target:
+            ProductDistributor.objects.bulk_create(offers,
+                                                   batch_size=self.chunk_size,
+                                                   update_conflicts=True,
+                                                   unique_fields=['product', 'distributor'],
+                                                   update_fields=update_fields)
+            return
+
+        # запасной вариант для бэкендов без ON CONFLICT: разделение на обновляемые и новые записи
+        existing = dict(ProductDistributor.objects.filter(distributor=self.distributor,
+                                                          product__in=[offer.product_id for offer in offers])
+                        .values_list('product_id', 'id'))
+        for offer in offers:
+            offer.id = existing.get(offer.product_id)
+        ProductDistributor.objects.bulk_update([offer for offer in offers if offer.id],
+                                               update_fields, batch_size=self.chunk_size)
+        ProductDistributor.objects.bulk_create([offer for offer in offers if not offer.id],
+                                               batch_size=self.chunk_size)
+
+    def remove_missing_offers(self):
+        """
+        Удаление предложений поставщика на товары, которых нет среди seen_products
+        """
+        stale = [(offer_id, product_id) for offer_id, product_id in ProductDistributor.objects.filter(
+            distributor=self.distributor).values_list('id', 'product_id') if product_id not in self.seen_products]
+        with self._phase('write'):
+            for chunk in chunked(stale, self.chunk_size):
+                offer_ids = [offer_id for offer_id, _ in chunk]
+                # строки корзин и заказов сохраняют наименования, но теряют ссылку на предложение
+                Basket.objects.filter(offer__in=offer_ids).update(offer=None)
+                OrderLine.objects.filter(offer__in=offer_ids).update(offer=None)
+                _fast_delete(ProductDistributor.objects.filter(id__in=offer_ids))
+        self.touched_products.update(product_id for _, product_id in stale)
+        self._touch([product_id for _, product_id in stale])
+        invalidate_products(product_id for _, product_id in stale)
+        self.stats['removed'] = len(stale)
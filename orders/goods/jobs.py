@@ -0,0 +1,109 @@
+"""
+Фоновый импорт прайсов
+
+Очередь задач хранится в модели ImportJob. Задачи выполняет локальный пул потоков веб-процесса
+(IMPORT_JOB_WORKERS) или отдельный процесс manage.py process_import_jobs.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .importer import PriceListImporter
+from .models import ImportJob
+from .parsers import iter_goods
+from .pricelist import PriceListError
+
+
+# задача в статусе running, обработчик которой не записал ни одного пакета за это время, считается
+# брошенной (процесс завершился аварийно) и снова захватывается; уже записанные пакеты при повторе не меняются
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+_executor = None
+
+
+def claim_job(job_id=None):
+    """
+    Захват задачи из очереди или брошенной задачи. Статус меняется условным UPDATE, поэтому одну задачу
+    не возьмут в работу два обработчика
+    :param job_id: int - конкретная задача, иначе самая старая в очереди
+    :return: ImportJob или None
+    """
+    now = timezone.now()
+    claimable = Q(status='queued') | Q(status='running', heartbeat__lt=now - CLAIM_TIMEOUT)
+    queryset = ImportJob.objects.filter(claimable)
+    if job_id is not None:
+        queryset = queryset.filter(pk=job_id)
+
+    for pk in queryset.order_by('created').values_list('pk', flat=True)[:10]:
+        if ImportJob.objects.filter(claimable, pk=pk).update(status='running', started=now, heartbeat=now):
+            return ImportJob.objects.select_related('distributor').get(pk=pk)
+    return None
+
+
+def process_job(job):
+    """
+    Выполнение импорта по задаче. Каждый пакет фиксируется вместе с прогрессом задачи,
+    поэтому processed всегда равен числу записанных позиций
+    """
+    def report(stats):
+        ImportJob.objects.filter(pk=job.pk).update(processed=stats['rows'], rows_per_sec=stats['rows_per_sec'],
+                                                   heartbeat=timezone.now())
+
+    try:
+        with job.file.open('rb') as stream:
+            importer = PriceListImporter(job.distributor, remove_missing=job.remove_missing)
+            stats = importer.run(iter_goods(stream, job.content_type), commit_each_chunk=True, on_chunk=report)
+    except PriceListError as error:
+        job.status, job.error = 'failed', str(error)
+    except Exception as error:
+        job.status, job.error = 'failed', repr(error)
+        raise
+    else:
+        job.status = 'done'
+        job.processed, job.rows_per_sec = stats['rows'], stats['rows_per_sec']
+    finally:
+        job.finished = timezone.now()
+        fields = ['status', 'error', 'finished', 'file']
+        if job.status == 'done':
+            fields += ['processed', 'rows_per_sec']
+        # загруженный прайс больше не нужен: задача завершена или отклонена
+        job.file.delete(save=False)
+        job.file = ''
+        job.save(update_fields=fields)
+
+
+def run_next_job(job_id=None):
+    """
+    Захват и выполнение одной задачи
+    :return: bool - была ли выполнена задача
+    """
+    job = claim_job(job_id)
+    if job is None:
+        return False
+    process_job(job)
+    return True
+
+
+def submit_job(job_id):
+    """
+    Передача задачи в пул потоков текущего процесса. При IMPORT_JOB_WORKERS = 0 задача
+    остается в очереди для manage.py process_import_jobs
+    """
+    global _executor
+    if not settings.IMPORT_JOB_WORKERS:
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMPORT_JOB_WORKERS, thread_name_prefix='import-job')
+    _executor.submit(_run_in_thread, job_id)
+
+
+def _run_in_thread(job_id):
+    try:
+        run_next_job(job_id)
+    finally:
+        # у каждого потока пула свое соединение с БД
+        connection.close()
@@ -0,0 +1,130 @@
+"""
+Нагрузка на обработчики Django без HTTP-сервера для команд benchmark_* и stress_orders
+
+WSGI-запросы выполняются пулом потоков, как gunicorn с --threads, ASGI-запросы - в одной петле
+событий, как uvicorn. Запрос проходит все middleware и сигналы начала и конца запроса,
+поэтому соединения с БД открываются и закрываются так же, как на сервере.
+"""
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+
+
+def run_wsgi(requests, concurrency):
+    """
+    :param requests: list - (метод, путь с query string, тело запроса в JSON или b'')
+    :return: list - (HTTP-статус, время ответа в секундах)
+    """
+    application = get_wsgi_application()
+
+    def request(item):
+        method, url, body = item
+        url = urlsplit(url)
+        environ = {'PATH_INFO': url.path, 'QUERY_STRING': url.query, 'REQUEST_METHOD': method,
+                   'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)), 'wsgi.input': BytesIO(body)}
+        setup_testing_defaults(environ)
+        status = []
+        started = time.perf_counter()
+        response = application(environ, lambda line, headers: status.append(int(line.split()[0])))
+        b''.join(response)
+        # как WSGI-сервер: close() завершает запрос и закрывает соединение с БД
+        response.close()
+        return status[0], time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(request, requests))
+
+
+def run_asgi(requests, concurrency):
+    """
+    :param requests: list - (метод, путь с query string, тело запроса в JSON или b'')
+    :return: list - (HTTP-статус, время ответа в секундах)
+    """
+    application = get_asgi_application()
+
+    async def request(item, semaphore):
+        method, url, body = item
+        url = urlsplit(url)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+            'query_string': url.query.encode(),
+            'headers': [(b'host', b'127.0.0.1'), (b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode())],
+            'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        finished = asyncio.Event()
+        status = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif not message.get('more_body'):
+                finished.set()
+
+        async with semaphore:
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            return status[0], time.perf_counter() - started
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[request(item, semaphore) for item in requests])
+
+    return asyncio.run(run())
+
+
+def summary(results, elapsed):
+    """
+    Итоги замера: запросов в секунду, медиана и 99-й процентиль времени ответа
+    """
+    timings = sorted(timing for _, timing in results)
+    return (f'{len(results) / elapsed:.0f} requests/s, '
+            f'median {statistics.median(timings) * 1000:.1f}ms, '
+            f'p99 {timings[int(len(timings) * 0.99) - 1] * 1000:.1f}ms')
+
+
+# данные покупателя для подтверждения заказа
+ORDER_CONFIRMATION = {
+    'last_name': 'Stress',
+    'first_name': 'Test',
+    'middle_name': 'Order',
+    'email': 'stress@example.com',
+    'phone': '0',
+    'address': {'city': 'City', 'street': 'Street', 'building': '1', 'office': '1'},
+}
+
+
+def place_order(client, offers, quantity=1):
+    """
+    Оформление заказа через API: строки корзины на все предложения и подтверждение заказа.
+    Строки и предложения передаются в случайном порядке: блокировки должны браться в порядке id
+    :param client: APIClient
+    :param offers: list - id предложений
+    :return: str - 'ordered', 'rejected by basket', 'rejected by order' или 'HTTP <код>'
+    """
+    lines = [{'offer': offer, 'quantity': quantity} for offer in random.sample(offers, len(offers))]
+    response = client.post('/basket/bulk/', lines, format='json')
+    if response.status_code == 400:
+        return 'rejected by basket'
+    if response.status_code != 201:
+        return f'HTTP {response.status_code}'
+    baskets = [line['id'] for line in response.json()['lines']]
+    random.shuffle(baskets)
+    response = client.post('/confirmation/', dict(ORDER_CONFIRMATION, baskets=baskets), format='json')
+    return {201: 'ordered', 400: 'rejected by order'}.get(response.status_code, f'HTTP {response.status_code}')
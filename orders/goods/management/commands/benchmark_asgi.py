@@ -0,0 +1,64 @@
+import time
+import types
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from goods import async_views
+from goods.loadtest import run_asgi, run_wsgi, summary
+from goods.models import OrderMeta, Product
+from orders import urls
+
+
+class Command(BaseCommand):
+    """
+    Сравнение обработки запросов под WSGI (синхронные представления DRF, пул потоков, как у gunicorn
+    с --threads) и под ASGI (goods.async_views, одна петля событий, как у uvicorn) на одной машине.
+    Запросы передаются обработчикам Django напрямую, без HTTP-сервера, поэтому сравнивается
+    только работа приложения и БД
+    """
+    help = 'Compare requests/sec and latency of WSGI and ASGI handlers on the hot read endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per deployment')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent requests (threads for WSGI)')
+        parser.add_argument('--url', action='append', dest='urls',
+                            help='Path to request, can be repeated (default: product list and card, basket, order)')
+
+    def handle(self, *args, **options):
+        paths = options['urls'] or self.default_paths()
+        if not paths:
+            raise CommandError('No products or orders in the database, import a price list first')
+
+        sync_urlpatterns = [pattern for pattern in urls.urlpatterns if pattern not in async_views.urlpatterns]
+        deployments = [
+            ('WSGI', run_wsgi, sync_urlpatterns),
+            ('ASGI', run_asgi, async_views.urlpatterns + sync_urlpatterns),
+        ]
+        for name, run, urlpatterns in deployments:
+            urlconf = types.ModuleType(f'benchmark_{name.lower()}_urls')
+            urlconf.urlpatterns = urlpatterns
+            with override_settings(ROOT_URLCONF=urlconf):
+                clear_url_caches()
+                requests = [('GET', paths[index % len(paths)], b'') for index in range(options['requests'])]
+                started = time.perf_counter()
+                results = run(requests, options['concurrency'])
+                elapsed = time.perf_counter() - started
+            clear_url_caches()
+            self.report(name, results, elapsed)
+
+    @staticmethod
+    def default_paths():
+        paths = ['/products/?page_size=20', '/basket/']
+        product_id = Product.objects.order_by('id').values_list('id', flat=True).first()
+        if product_id is not None:
+            paths.append(f'/products/{product_id}/')
+        order_id = OrderMeta.objects.order_by('id').values_list('id', flat=True).first()
+        if order_id is not None:
+            paths.append(f'/order/{order_id}/')
+        return paths if product_id is not None else []
+
+    def report(self, name, results, elapsed):
+        errors = sum(status != 200 for status, _ in results)
+        self.stdout.write(f'{name}: {summary(results, elapsed)}, non-200 responses {errors}')
@@ -0,0 +1,127 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from goods.models import Basket, Distributor, Product, ProductDistributor, User
+from goods.views import BasketViewSet
+
+
+class Rollback(Exception):
+    pass
+
+
+class PerItemBasketSerializer(serializers.ModelSerializer):
+    """
+    Прежний расчет строки корзины для сравнения: товар, пользователь, поставщик и предложение
+    запрашиваются отдельно в validate() и повторно в create()
+    """
+    class Meta:
+        model = Basket
+        fields = ['id', 'product', 'distributor', 'price', 'quantity', 'sum', 'total_price']
+        read_only_fields = ['id', 'price', 'sum', 'total_price']
+
+    def create(self, validated_data):
+        product = Product.objects.get(name=validated_data['product'])
+        user = User.objects.get(last_name=validated_data['distributor'])
+        distributor = Distributor.objects.get(user=user.id)
+
+        delivery_price = ProductDistributor.objects.filter(distributor=distributor).get(product=product).delivery_price
+        price = ProductDistributor.objects.filter(distributor=distributor).get(product=product).price
+
+        validated_data['price'] = price
+        validated_data['sum'] = validated_data['quantity'] * validated_data['price']
+        validated_data['total_price'] = validated_data['sum'] + delivery_price
+
+        return Basket.objects.create(**validated_data)
+
+    def validate(self, attr):
+        product = Product.objects.get(name=attr.get('product')).id
+        quantity_limit = ProductDistributor.objects.get(product=product).quantity
+
+        user = User.objects.get(last_name=attr.get('distributor'))
+        if user.type != 'distributor':
+            raise serializers.ValidationError('The user is not distributor')
+        distributor = Distributor.objects.get(user=user)
+        if not distributor.status:
+            raise serializers.ValidationError('Now the distributor is unavailable')
+
+        if attr.get('quantity') > quantity_limit:
+            raise serializers.ValidationError(f'Not enough items, max quantity is {quantity_limit}')
+
+        return attr
+
+
+class Command(BaseCommand):
+    """
+    Замер времени POST /basket/ на предложениях из БД. Созданные строки корзины откатываются.
+    С --per-item запросы обрабатываются прежним расчетом строки (PerItemBasketSerializer)
+    """
+    help = 'Measure basket POST latency and queries per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Number of basket POST requests')
+        parser.add_argument('--by-offer', action='store_true',
+                            help='Reference offers by id instead of product and distributor names')
+        parser.add_argument('--per-item', action='store_true',
+                            help='Baseline: price basket lines with separate product, user, distributor '
+                                 'and offer queries')
+
+    def handle(self, *args, **options):
+        if options['per_item'] and options['by_offer']:
+            raise CommandError('--per-item references offers by product and distributor names')
+
+        offers = ProductDistributor.objects.filter(quantity__gt=0).select_related('product', 'distributor__user')
+        if options['per_item']:
+            # прежний расчет находит остаток по товару без поставщика: только товары с одним предложением
+            offers = offers.annotate(offers_count=Count('product__product_distributors')).filter(offers_count=1)
+        offers = list(offers[:options['requests']])
+        if not offers:
+            raise CommandError('No offers in the database, import a price list first')
+
+        serializer_class = BasketViewSet.serializer_class
+        if options['per_item']:
+            BasketViewSet.serializer_class = PerItemBasketSerializer
+        # как тестовый раннер: тестовый клиент обращается к хосту testserver
+        setup_test_environment()
+        try:
+            timings, queries = self.post_lines(offers, options)
+        finally:
+            teardown_test_environment()
+            BasketViewSet.serializer_class = serializer_class
+
+        timings.sort()
+        self.stdout.write(f'{len(timings)} requests: mean {statistics.mean(timings) * 1000:.2f}ms, '
+                          f'median {statistics.median(timings) * 1000:.2f}ms, '
+                          f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.2f}ms, '
+                          f'queries per request {statistics.mean(queries):.1f}')
+
+    @staticmethod
+    def post_lines(offers, options):
+        client = APIClient()
+        timings, queries = [], []
+        try:
+            with transaction.atomic():
+                for index in range(options['requests']):
+                    offer = offers[index % len(offers)]
+                    if options['by_offer']:
+                        data = {'offer': offer.id, 'quantity': 1}
+                    else:
+                        data = {'product': offer.product.name, 'distributor': offer.distributor.user.last_name,
+                                'quantity': 1}
+                    with CaptureQueriesContext(connection) as context:
+                        started = time.perf_counter()
+                        response = client.post('/basket/', data, format='json')
+                        timings.append(time.perf_counter() - started)
+                    if response.status_code != 201:
+                        raise CommandError(f'POST /basket/ returned {response.status_code}: {response.content!r}')
+                    queries.append(len(context.captured_queries))
+                raise Rollback
+        except Rollback:
+            pass
+        return timings, queries
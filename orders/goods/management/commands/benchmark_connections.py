@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from goods.loadtest import run_asgi, run_wsgi, summary
+from goods.models import Product
+from orders.db_pool.base import get_pool
+
+
+class Command(BaseCommand):
+    """
+    Сравнение режимов соединения с БД на коротких запросах: новое соединение на каждый запрос
+    (CONN_MAX_AGE = 0), постоянные соединения потоков (CONN_MAX_AGE > 0) и пул соединений процесса
+    (orders.db_pool). Для каждого режима выводится количество открытых соединений с PostgreSQL
+    """
+    help = 'Compare requests/sec and number of opened database connections with and without pooling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent requests (threads for WSGI)')
+        parser.add_argument('--pool-size', type=int, default=16, help='Max connections in the pool')
+        parser.add_argument('--asgi', action='store_true', help='Run requests under ASGI instead of WSGI')
+        parser.add_argument('--url', action='append', dest='urls',
+                            help='Path to request, can be repeated (default: product card and basket)')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'postgresql':
+            raise CommandError('Connection pooling is only available for PostgreSQL')
+        paths = options['urls'] or self.default_paths()
+        if not paths:
+            raise CommandError('No products in the database, import a price list first')
+
+        requests = [('GET', paths[index % len(paths)], b'') for index in range(options['requests'])]
+        run = run_asgi if options['asgi'] else run_wsgi
+        settings_dict = connections.settings['default']
+        initial = dict(settings_dict)
+        modes = [
+            ('No persistent connections', 'django.db.backends.postgresql', 0, {}),
+            ('CONN_MAX_AGE = 60', 'django.db.backends.postgresql', 60, {}),
+            (f'Pool of {options["pool_size"]}', 'orders.db_pool', 0,
+             {'pool': {'max_size': options['pool_size'], 'timeout': 30, 'check_idle': 30}}),
+        ]
+
+        opened = []
+
+        def count(**kwargs):
+            opened.append(kwargs['connection'].alias)
+
+        connection_created.connect(count)
+        try:
+            for name, engine, conn_max_age, options_dict in modes:
+                # соединения потоков создаются заново по настройкам из connections.settings
+                settings_dict.update(ENGINE=engine, CONN_MAX_AGE=conn_max_age,
+                                     OPTIONS={**initial['OPTIONS'], **options_dict})
+                opened.clear()
+                pool_created = get_pool(settings_dict).created if options_dict else 0
+                started = time.perf_counter()
+                results = run(requests, options['concurrency'])
+                elapsed = time.perf_counter() - started
+                connections_count = get_pool(settings_dict).created - pool_created if options_dict else len(opened)
+                errors = sum(status != 200 for status, _ in results)
+                self.stdout.write(f'{name}: {summary(results, elapsed)}, '
+                                  f'database connections {connections_count}, non-200 responses {errors}')
+        finally:
+            connection_created.disconnect(count)
+            settings_dict.clear()
+            settings_dict.update(initial)
+
+    @staticmethod
+    def default_paths():
+        product_id = Product.objects.order_by('id').values_list('id', flat=True).first()
+        return [] if product_id is None else [f'/products/{product_id}/', '/basket/']
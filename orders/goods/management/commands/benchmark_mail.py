@@ -0,0 +1,112 @@
+import socketserver
+import threading
+import time
+from datetime import timedelta
+
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from goods.models import OutgoingEmail
+from goods.outbox import drain_outbox, queue_mass_mail
+
+
+FROM_EMAIL = 'benchmark@example.com'
+
+
+class Rollback(Exception):
+    pass
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    Локальный SMTP-сервер, который принимает и отбрасывает письма. Задержка перед приветствием
+    имитирует установку TCP- и TLS-соединения и авторизацию настоящего сервера
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connect_delay = connect_delay
+        self.connections = self.messages = 0
+        self.lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_delay)
+        self.reply('220 localhost SMTP stand-in')
+        for line in iter(self.rfile.readline, b''):
+            command = line.decode('ascii', 'replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in iter(self.rfile.readline, b''):
+                    if data.rstrip(b'\r\n') == b'.':
+                        break
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class Command(BaseCommand):
+    """
+    Сравнение отправки писем по одному соединению на письмо (send_mail) и пакетами через
+    очередь OutgoingEmail на локальном SMTP-сервере. Письма очереди, созданные замером, откатываются
+    """
+    help = 'Measure email throughput with one SMTP connection per message and per outbox batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500, help='Number of emails to send')
+        parser.add_argument('--batch-size', type=int, help='Emails per SMTP connection for the outbox')
+        parser.add_argument('--connect-delay', type=float, default=0.05,
+                            help='Seconds the stand-in server waits before the greeting')
+
+    def handle(self, *args, **options):
+        server = SMTPStandIn(options['connect_delay'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        mail_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1], EMAIL_USE_SSL=False, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_OUTBOX_WORKERS=0)
+        messages = [(f'Benchmark {index}', 'Benchmark message', FROM_EMAIL, [f'customer{index}@example.com'])
+                    for index in range(options['messages'])]
+        try:
+            with mail_settings:
+                self.measure('send_mail per message', server, lambda: [send_mail(*message) for message in messages])
+                try:
+                    with transaction.atomic():
+                        # письма, уже стоящие в очереди, в замер не попадают
+                        OutgoingEmail.objects.filter(status='queued').update(
+                            next_attempt=timezone.now() + timedelta(days=1))
+                        self.measure('outbox batches', server, lambda: (
+                            queue_mass_mail(messages), drain_outbox(options['batch_size'])))
+                        raise Rollback
+                except Rollback:
+                    pass
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def measure(self, name, server, send):
+        server.connections = server.messages = 0
+        started = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{name}: {server.messages} emails in {elapsed:.2f}s, '
+                          f'{server.messages / elapsed:.0f} emails/s, {server.connections} SMTP connections')
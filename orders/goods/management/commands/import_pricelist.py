@@ -0,0 +1,122 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from goods.importer import PriceListImporter, iter_normalized
+from goods.models import Distributor
+from goods.parsers import iter_goods
+from goods.pricelist import PriceListError
+
+
+PRICE_LIST_EXTENSIONS = ('.yaml', '.yml', '.ndjson', '.jsonl')
+
+
+class Command(BaseCommand):
+    """
+    Импорт прайсов поставщика из локальных файлов тем же движком, что и PartnerUpdate.
+    Файлы одного поставщика загружаются по очереди: параллельные транзакции создавали бы
+    одинаковые товары и параметры (наименования не уникальны). Позиции каждого файла
+    проверяются и нормализуются параллельно в --workers процессах
+    """
+    help = 'Import distributor price lists (YAML or NDJSON) from a local file or directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Price list file or directory with price lists')
+        parser.add_argument('--distributor', help='Distributor e-mail, required unless --benchmark')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes used to validate and normalise rows of each file')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows per chunk')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk inserts instead of COPY on PostgreSQL')
+        parser.add_argument('--remove-missing', action='store_true',
+                            help='Remove offers for products that are absent from the imported files')
+        parser.add_argument('--benchmark', action='store_true',
+                            help='Only measure validation/normalisation speed from 1 to --workers processes')
+
+    def handle(self, *args, **options):
+        paths = self.collect_paths(options['path'])
+        if options['benchmark']:
+            return self.benchmark(paths[0], options['workers'] or os.cpu_count() or 1,
+                                  options['chunk_size'] or 2000)
+
+        if not options['distributor']:
+            raise CommandError('--distributor is required')
+        try:
+            distributor = Distributor.objects.get(user__email=options['distributor'])
+        except Distributor.DoesNotExist:
+            raise CommandError(f"Distributor {options['distributor']} does not exist")
+
+        # при загрузке нескольких файлов отсутствующие предложения удаляются один раз по всем файлам
+        single = len(paths) == 1
+        importers = [PriceListImporter(distributor,
+                                       chunk_size=options['chunk_size'],
+                                       workers=options['workers'],
+                                       remove_missing=single and options['remove_missing'],
+                                       use_copy=not options['no_copy'])
+                     for _ in paths]
+
+        started = time.monotonic()
+        # ошибка в файле откатывает только его транзакцию, остальные файлы загружаются
+        errors = [error for error in map(self.import_file, importers, paths) if error]
+
+        if not single and options['remove_missing'] and not errors:
+            total = PriceListImporter(distributor)
+            for importer in importers:
+                total.seen_products |= importer.seen_products
+            with transaction.atomic():
+                total.remove_missing_offers()
+            self.stdout.write(f"removed offers: {total.stats['removed']}")
+
+        self.stdout.write(f'{len(paths)} file(s) in {time.monotonic() - started:.3f}s')
+        if errors:
+            raise CommandError('\n'.join(errors))
+
+    def import_file(self, importer, path):
+        """
+        Импорт одного файла в одной транзакции
+        :return: str - текст ошибки или None
+        """
+        try:
+            with open(path, 'rb') as stream:
+                stats = importer.run(iter_goods(stream, self.content_type(path)))
+        except PriceListError as error:
+            return f'{path}: {error}'
+        except Exception as error:
+            # ошибки БД и кодировки файла также не прерывают загрузку остальных файлов
+            return f'{path}: {error.__class__.__name__}: {error}'
+
+        phases = ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in stats.pop('phases').items())
+        self.stdout.write(f'{path}: {stats}; {phases}')
+
+    def benchmark(self, path, max_workers, chunk_size):
+        with open(path, 'rb') as stream:
+            goods = list(iter_goods(stream, self.content_type(path)))
+
+        base = None
+        for workers in range(1, max_workers + 1):
+            started = time.monotonic()
+            rows = sum(len(batch) for batch in iter_normalized(goods, chunk_size, workers))
+            seconds = time.monotonic() - started
+            base = base or seconds
+            self.stdout.write(f'workers={workers}: {rows} rows in {seconds:.3f}s, '
+                              f'{round(rows / seconds)} rows/sec, speedup x{base / seconds:.2f}')
+
+    @staticmethod
+    def collect_paths(path):
+        if os.path.isdir(path):
+            paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                           if name.endswith(PRICE_LIST_EXTENSIONS))
+        elif os.path.isfile(path):
+            paths = [path]
+        else:
+            raise CommandError(f'{path} does not exist')
+        if not paths:
+            raise CommandError(f'No price lists found in {path}')
+        return paths
+
+    @staticmethod
+    def content_type(path):
+        if path.endswith(('.ndjson', '.jsonl')):
+            return 'application/x-ndjson'
+        return 'application/yaml'
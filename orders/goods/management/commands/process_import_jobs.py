@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from goods.jobs import run_next_job
+
+
+class Command(BaseCommand):
+    """
+    Обработчик очереди фонового импорта прайсов (модель ImportJob)
+    """
+    help = 'Process queued price-list import jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for _ in range(options['workers']):
+                executor.submit(self.work, options['poll_interval'], options['once'])
+
+    def work(self, poll_interval, once):
+        try:
+            while True:
+                try:
+                    processed = run_next_job()
+                except Exception as error:
+                    self.stderr.write(f'Import job failed: {error!r}')
+                    continue
+                if processed:
+                    continue
+                if once:
+                    return
+                time.sleep(poll_interval)
+        finally:
+            connection.close()
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from goods.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    """
+    Обработчик очереди исходящих писем (модель OutgoingEmail)
+    """
+    help = 'Send queued emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Emails per SMTP connection')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                try:
+                    claimed, sent = process_outbox(options['batch_size'])
+                except Exception as error:
+                    self.stderr.write(f'Sending queued emails failed: {error!r}')
+                    claimed = 0
+                else:
+                    if claimed:
+                        self.stdout.write(f'Sent {sent} of {claimed} emails')
+                        continue
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+        finally:
+            connection.close()
@@ -0,0 +1,138 @@
+import logging
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test.utils import override_settings, setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+from rest_framework.test import APIClient
+
+from goods.loadtest import place_order
+from goods.models import Distributor, OrderLine, OrderMeta, Product, ProductDistributor, User
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочная проверка оформления заказов: параллельные потоки добавляют строки в корзину
+    и подтверждают заказы на одни и те же предложения, пока остатки не закончатся. После этого
+    проверяется, что продано не больше, чем было на складе, затем каждый заказ одновременно
+    отменяется дважды и проверяется, что остатки вернулись ровно один раз. Команда, как
+    TransactionTestCase, создает отдельную тестовую БД и удаляет ее после проверки
+    """
+    help = 'Fire concurrent basket and confirmation requests and check that stock is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Number of concurrent clients')
+        parser.add_argument('--orders', type=int, default=400, help='Number of orders to attempt')
+        parser.add_argument('--offers', type=int, default=3, help='Offers in every order')
+        parser.add_argument('--stock', type=int, default=100, help='Initial quantity of every offer')
+        parser.add_argument('--quantity', type=int, default=1, help='Quantity of every order line')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            # SQLite блокирует всю БД на запись, а тестовая БД в памяти не видна другим потокам
+            raise CommandError('Stress test requires PostgreSQL')
+
+        # отказы из-за нехватки товара ожидаемы, в лог они не выводятся
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        # как тестовый раннер: тестовый клиент обращается к хосту testserver, письма остаются в памяти
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            # письма остаются в очереди: фоновая отправка держала бы соединение с тестовой БД при ее удалении
+            with override_settings(EMAIL_OUTBOX_WORKERS=0):
+                offers = self.create_offers(options['offers'], options['stock'])
+                outcomes, timings, elapsed = self.run_clients(offers, options)
+                self.report(offers, options, outcomes, timings, elapsed)
+                self.cancel_orders(offers, options)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def create_offers(self, count, stock):
+        ProductDistributor.objects.all().delete()
+        user = User.objects.create_user(email='stress-distributor@example.com', last_name='Stress',
+                                        type='distributor')
+        distributor = Distributor.objects.create(user=user)
+        return [ProductDistributor.objects.create(product=Product.objects.create(name=f'Stress product {index}'),
+                                                  distributor=distributor, price=10, quantity=stock).id
+                for index in range(count)]
+
+    def run_clients(self, offers, options):
+        outcomes, timings = Counter(), []
+        lock = threading.Lock()
+        start = threading.Barrier(options['threads'])
+
+        def client(orders):
+            api = APIClient(raise_request_exception=False)
+            start.wait()
+            try:
+                for _ in range(orders):
+                    started = time.perf_counter()
+                    outcome = place_order(api, offers, options['quantity'])
+                    with lock:
+                        outcomes[outcome] += 1
+                        timings.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        shares = [options['orders'] // options['threads'] + (index < options['orders'] % options['threads'])
+                  for index in range(options['threads'])]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            for future in [executor.submit(client, share) for share in shares]:
+                future.result()
+        return outcomes, timings, time.perf_counter() - started
+
+    def report(self, offers, options, outcomes, timings, elapsed):
+        timings.sort()
+        self.stdout.write(f"{len(timings)} orders from {options['threads']} threads in {elapsed:.2f}s: "
+                          f'{len(timings) / elapsed:.1f} orders/s, '
+                          f'median {statistics.median(timings) * 1000:.1f}ms, '
+                          f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.1f}ms')
+        self.stdout.write(', '.join(f'{outcome}: {count}' for outcome, count in sorted(outcomes.items())))
+
+        # проданное количество и остаток каждого предложения должны давать исходный остаток
+        sold = dict(OrderLine.objects.filter(offer__in=offers).values_list('offer').annotate(Sum('quantity')))
+        errors = []
+        for offer_id, remaining in ProductDistributor.objects.filter(pk__in=offers).values_list('id', 'quantity'):
+            self.stdout.write(f'offer {offer_id}: sold {sold.get(offer_id, 0)}, remaining {remaining}')
+            if sold.get(offer_id, 0) + remaining != options['stock'] or remaining < 0:
+                errors.append(offer_id)
+        if outcomes['ordered'] * options['quantity'] > options['stock']:
+            errors.append('orders')
+        # ни одного заказа - проверка остатков ничего не доказывает
+        if not outcomes['ordered']:
+            errors.append('no orders placed')
+        unexpected = [outcome for outcome in outcomes if outcome.startswith('HTTP')]
+        if errors or unexpected:
+            raise CommandError(f'Stock check failed: {errors or unexpected}')
+        self.stdout.write(self.style.SUCCESS('No oversell'))
+
+    def cancel_orders(self, offers, options):
+        orders = list(OrderMeta.objects.values_list('id', flat=True))
+
+        def cancel(order_id):
+            try:
+                return APIClient(raise_request_exception=False).patch(
+                    f'/order_status/{order_id}/', {'status': 'cancelled'}, format='json').status_code
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            statuses = Counter(executor.map(cancel, orders + orders))
+        self.stdout.write(f'{len(orders) * 2} cancellations in {time.perf_counter() - started:.2f}s: '
+                          + ', '.join(f'HTTP {status}: {count}' for status, count in sorted(statuses.items())))
+
+        remaining = dict(ProductDistributor.objects.filter(pk__in=offers).values_list('id', 'quantity'))
+        if set(statuses) != {200} or any(quantity != options['stock'] for quantity in remaining.values()):
+            raise CommandError(f'Stock is not restored after cancellation: {remaining}')
+        self.stdout.write(self.style.SUCCESS('Stock restored exactly once'))
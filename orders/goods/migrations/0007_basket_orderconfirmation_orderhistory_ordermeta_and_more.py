@@ -0,0 +1,197 @@
+# Generated by Django 4.2.3 on 2026-10-17 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0006_alter_distributor_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Basket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product", models.CharField(max_length=100)),
+                ("distributor", models.CharField(max_length=100)),
+                ("price", models.FloatField(default=10000)),
+                ("quantity", models.PositiveIntegerField()),
+                ("sum", models.FloatField()),
+                ("total_price", models.FloatField(default=10000)),
+            ],
+            options={
+                "verbose_name": "Корзина",
+                "verbose_name_plural": "Корзины",
+            },
+        ),
+        migrations.CreateModel(
+            name="OrderConfirmation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("basket", models.IntegerField()),
+                ("last_name", models.CharField(max_length=50)),
+                ("first_name", models.CharField(max_length=25)),
+                ("middle_name", models.CharField(max_length=30)),
+                ("email", models.EmailField(max_length=254)),
+                ("phone", models.CharField(max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="OrderHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("result_price", models.FloatField()),
+                (
+                    "order_confirmation",
+                    models.CharField(
+                        choices=[
+                            ("new", "новый"),
+                            ("paid", "оплачен"),
+                            ("delivered", "доставлен"),
+                            ("cancelled", "отменен"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="OrderMeta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateTimeField(auto_now_add=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("new", "новый"),
+                            ("paid", "оплачен"),
+                            ("delivered", "доставлен"),
+                            ("cancelled", "отменен"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "basket",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE, to="goods.basket"
+                    ),
+                ),
+                (
+                    "order_confirmation",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="goods.orderconfirmation",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name="orderedproduct",
+            name="distributor",
+        ),
+        migrations.RemoveField(
+            model_name="orderedproduct",
+            name="order",
+        ),
+        migrations.RemoveField(
+            model_name="productorder",
+            name="order",
+        ),
+        migrations.RemoveField(
+            model_name="productorder",
+            name="product",
+        ),
+        migrations.AlterModelOptions(
+            name="address",
+            options={"verbose_name": "Адрес", "verbose_name_plural": "Адреса"},
+        ),
+        migrations.RemoveField(
+            model_name="product",
+            name="price",
+        ),
+        migrations.RemoveField(
+            model_name="product",
+            name="price_with_delivery",
+        ),
+        migrations.RemoveField(
+            model_name="product",
+            name="quantity",
+        ),
+        migrations.AddField(
+            model_name="productdistributor",
+            name="price",
+            field=models.FloatField(default=10000),
+        ),
+        migrations.AddField(
+            model_name="productdistributor",
+            name="quantity",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name="productdistributor",
+            name="delivery_price",
+            field=models.FloatField(blank=True, default=0),
+        ),
+        migrations.DeleteModel(
+            name="Order",
+        ),
+        migrations.DeleteModel(
+            name="OrderedProduct",
+        ),
+        migrations.DeleteModel(
+            name="ProductOrder",
+        ),
+        migrations.AddField(
+            model_name="orderhistory",
+            name="order",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.DO_NOTHING, to="goods.ordermeta"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderconfirmation",
+            name="address",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="order_confirmations",
+                to="goods.address",
+            ),
+        ),
+    ]
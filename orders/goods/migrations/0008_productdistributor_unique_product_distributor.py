@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-17 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0007_basket_orderconfirmation_orderhistory_ordermeta_and_more"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="productdistributor",
+            constraint=models.UniqueConstraint(
+                fields=("product", "distributor"), name="unique_product_distributor"
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.3 on 2026-10-17 17:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0008_productdistributor_unique_product_distributor"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file", models.FileField(upload_to="imports/")),
+                ("content_type", models.CharField(max_length=100)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "в очереди"),
+                            ("running", "выполняется"),
+                            ("done", "завершен"),
+                            ("failed", "ошибка"),
+                        ],
+                        db_index=True,
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("processed", models.PositiveIntegerField(default=0)),
+                ("rows_per_sec", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("started", models.DateTimeField(blank=True, null=True)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                (
+                    "distributor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_jobs",
+                        to="goods.distributor",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Задача импорта",
+                "verbose_name_plural": "Задачи импорта",
+                "ordering": ("created",),
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-17 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0009_importjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productdistributor",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:09
+
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # индекс для поиска по подстроке (name__icontains) доступен только в PostgreSQL
+    # с установленным расширением pg_trgm, в остальных случаях поиск работает без индекса
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS goods_product_name_trgm_idx "
+        "ON goods_product USING gin (UPPER(name::text) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS goods_product_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0010_productdistributor_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productdistributor",
+            index=models.Index(fields=["price"], name="goods_offer_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="productparameter",
+            index=models.Index(
+                fields=["parameter_name", "value"], name="goods_param_name_value_idx"
+            ),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0012_product_modified"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="name",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0013_product_name_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="basket",
+            name="offer",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="baskets",
+                to="goods.productdistributor",
+            ),
+        ),
+    ]
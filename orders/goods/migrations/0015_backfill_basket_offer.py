@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:20
+
+from django.db import migrations
+
+
+def backfill_basket_offer(apps, schema_editor):
+    # строки корзины связываются с предложением по наименованию товара и фамилии поставщика;
+    # если предложение не найдено или неоднозначно, ссылка остается пустой
+    Basket = apps.get_model("goods", "Basket")
+    ProductDistributor = apps.get_model("goods", "ProductDistributor")
+
+    pairs = (
+        Basket.objects.filter(offer__isnull=True)
+        .values_list("product", "distributor")
+        .distinct()
+    )
+    for product, distributor in pairs:
+        offers = list(
+            ProductDistributor.objects.filter(
+                product__name=product, distributor__user__last_name=distributor
+            ).values_list("id", flat=True)[:2]
+        )
+        if len(offers) == 1:
+            Basket.objects.filter(
+                offer__isnull=True, product=product, distributor=distributor
+            ).update(offer_id=offers[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0014_basket_offer"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_basket_offer, migrations.RunPython.noop),
+    ]
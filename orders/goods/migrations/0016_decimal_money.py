@@ -0,0 +1,45 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0015_backfill_basket_offer"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="basket",
+            name="price",
+            field=models.DecimalField(decimal_places=2, default=10000, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name="basket",
+            name="sum",
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name="basket",
+            name="total_price",
+            field=models.DecimalField(decimal_places=2, default=10000, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name="orderhistory",
+            name="result_price",
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name="productdistributor",
+            name="delivery_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, default=0, max_digits=12
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productdistributor",
+            name="price",
+            field=models.DecimalField(decimal_places=2, default=10000, max_digits=12),
+        ),
+    ]
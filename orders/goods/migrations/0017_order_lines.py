@@ -0,0 +1,87 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0016_decimal_money"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ordermeta",
+            name="total_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name="orderconfirmation",
+            name="basket",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="ordermeta",
+            name="basket",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="goods.basket",
+            ),
+        ),
+        migrations.CreateModel(
+            name="OrderLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product", models.CharField(max_length=100)),
+                ("distributor", models.CharField(max_length=100)),
+                ("price", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("quantity", models.PositiveIntegerField()),
+                ("sum", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("total_price", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "basket",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="order_line",
+                        to="goods.basket",
+                    ),
+                ),
+                (
+                    "offer",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="order_lines",
+                        to="goods.productdistributor",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="goods.ordermeta",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Строка заказа",
+                "verbose_name_plural": "Строки заказа",
+                "ordering": ("id",),
+            },
+        ),
+    ]
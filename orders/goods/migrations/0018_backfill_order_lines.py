@@ -0,0 +1,38 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:30
+
+from django.db import migrations
+
+
+def backfill_order_lines(apps, schema_editor):
+    # заказы, оформленные на одну строку корзины, получают строку заказа и итоговую сумму
+    OrderMeta = apps.get_model("goods", "OrderMeta")
+    OrderLine = apps.get_model("goods", "OrderLine")
+
+    orders = OrderMeta.objects.filter(
+        basket__isnull=False, lines__isnull=True
+    ).select_related("basket")
+    for order in orders.iterator(chunk_size=2000):
+        basket = order.basket
+        OrderLine.objects.create(
+            order=order,
+            basket=basket,
+            offer_id=basket.offer_id,
+            product=basket.product,
+            distributor=basket.distributor,
+            price=basket.price,
+            quantity=basket.quantity,
+            sum=basket.sum,
+            total_price=basket.total_price,
+        )
+        OrderMeta.objects.filter(pk=order.pk).update(total_price=basket.total_price)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0017_order_lines"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_lines, migrations.RunPython.noop),
+    ]
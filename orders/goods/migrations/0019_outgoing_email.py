@@ -0,0 +1,62 @@
+# Generated by Django 4.2.3 on 2026-10-17 18:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0018_backfill_order_lines"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutgoingEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("subject", models.CharField(max_length=255)),
+                ("body", models.TextField()),
+                ("from_email", models.CharField(blank=True, max_length=255)),
+                ("recipients", models.JSONField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "в очереди"),
+                            ("sent", "отправлено"),
+                            ("failed", "ошибка"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("error", models.TextField(blank=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("sent", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Письмо",
+                "verbose_name_plural": "Исходящие письма",
+                "ordering": ("id",),
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt"], name="goods_email_queue_idx"
+                    )
+                ],
+            },
+        ),
+    ]
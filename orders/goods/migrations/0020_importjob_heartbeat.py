@@ -0,0 +1,26 @@
+# Generated by Django 4.2.3 on 2026-10-17 19:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_heartbeat(apps, schema_editor):
+    # задачи, начатые до появления поля, считаются живыми с момента запуска
+    ImportJob = apps.get_model("goods", "ImportJob")
+    ImportJob.objects.filter(status="running").update(heartbeat=F("started"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0019_outgoing_email"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="heartbeat",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_heartbeat, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goods", "0020_importjob_heartbeat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="remove_missing",
+            field=models.BooleanField(default=False),
+        ),
+    ]
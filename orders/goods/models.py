@@ -1,6 +1,7 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 
@@ -11,6 +12,19 @@ STATUS_CHOICES = (
     ('cancelled', 'отменен'),
 )
 
+IMPORT_JOB_STATUS_CHOICES = (
+    ('queued', 'в очереди'),
+    ('running', 'выполняется'),
+    ('done', 'завершен'),
+    ('failed', 'ошибка'),
+)
+
+EMAIL_STATUS_CHOICES = (
+    ('queued', 'в очереди'),
+    ('sent', 'отправлено'),
+    ('failed', 'ошибка'),
+)
+
 USER_TYPE_CHOICES = (
     ('distributor', 'поставщик'),
     ('customer', 'покупатель'),
@@ -102,9 +116,11 @@ class Parameter(models.Model):
 
 
 class Product(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     parameter = models.ManyToManyField(Parameter, related_name='products', through='ProductParameter')
     distributor = models.ManyToManyField(Distributor, related_name='products', through='ProductDistributor')
+    # время последнего изменения товара, его предложений или параметров (ETag и Last-Modified каталога)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Товар'
@@ -119,6 +135,11 @@ class ProductParameter(models.Model):
     product_name = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='prod_parameters')
     value = models.CharField(max_length=50)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['parameter_name', 'value'], name='goods_param_name_value_idx'),
+        ]
+
     def __str__(self):
         return f'{self.parameter_name}: {self.value}'
 
@@ -143,9 +164,18 @@ class ProductParameter(models.Model):
 class ProductDistributor(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_distributors')
     distributor = models.ForeignKey(Distributor, on_delete=models.CASCADE, related_name='product_distributors')
-    price = models.FloatField(default=10000)
-    delivery_price = models.FloatField(blank=True, default=0)
+    price = models.DecimalField(max_digits=12, decimal_places=2, default=10000)
+    delivery_price = models.DecimalField(max_digits=12, decimal_places=2, blank=True, default=0)
     quantity = models.PositiveIntegerField(default=1)
+    content_hash = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'distributor'], name='unique_product_distributor'),
+        ]
+        indexes = [
+            models.Index(fields=['price'], name='goods_offer_price_idx'),
+        ]
 
     # def __str__(self):
     #     return self.distributor
@@ -169,12 +199,15 @@ class Address(models.Model):
 
 
 class Basket(models.Model):
+    # предложение поставщика; наименование товара и фамилия поставщика сохраняются на момент заказа
+    offer = models.ForeignKey(ProductDistributor, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='baskets')
     product = models.CharField(max_length=100)
     distributor = models.CharField(max_length=100)
-    price = models.FloatField(default=10000)
+    price = models.DecimalField(max_digits=12, decimal_places=2, default=10000)
     quantity = models.PositiveIntegerField()
-    sum = models.FloatField()
-    total_price = models.FloatField(default=10000)
+    sum = models.DecimalField(max_digits=12, decimal_places=2)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=10000)
 
     class Meta:
         verbose_name = 'Корзина'
@@ -185,7 +218,8 @@ class Basket(models.Model):
 
 
 class OrderConfirmation(models.Model):
-    basket = models.IntegerField()
+    # строка корзины для заказа из одной позиции; заказ из нескольких строк передается списком baskets
+    basket = models.IntegerField(null=True, blank=True)
     last_name = models.CharField(max_length=50)
     first_name = models.CharField(max_length=25)
     middle_name = models.CharField(max_length=30)
@@ -195,17 +229,91 @@ class OrderConfirmation(models.Model):
 
 
 class OrderMeta(models.Model):
-    basket = models.OneToOneField(Basket, on_delete=models.CASCADE)
+    # заполняется только у заказов из одной строки корзины, состав заказа хранится в OrderLine
+    basket = models.OneToOneField(Basket, on_delete=models.CASCADE, null=True, blank=True)
     order_confirmation = models.OneToOneField(OrderConfirmation, on_delete=models.CASCADE)
     date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+class OrderLine(models.Model):
+    """
+    Строка заказа. Цены и наименования сохраняются на момент оформления заказа
+    """
+    order = models.ForeignKey(OrderMeta, on_delete=models.CASCADE, related_name='lines')
+    # строку корзины можно оформить в заказ только один раз
+    basket = models.OneToOneField(Basket, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_line')
+    offer = models.ForeignKey(ProductDistributor, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='order_lines')
+    product = models.CharField(max_length=100)
+    distributor = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    sum = models.DecimalField(max_digits=12, decimal_places=2)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Строка заказа'
+        verbose_name_plural = 'Строки заказа'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f"{self.distributor} - {self.product}"
 
 
 class OrderHistory(models.Model):
     order = models.OneToOneField(OrderMeta, on_delete=models.DO_NOTHING)
-    result_price = models.FloatField()
+    result_price = models.DecimalField(max_digits=12, decimal_places=2)
     order_confirmation = models.CharField(max_length=20, choices=STATUS_CHOICES)
 
 
+class ImportJob(models.Model):
+    """
+    Задача фонового импорта прайса поставщика
+    """
+    distributor = models.ForeignKey(Distributor, on_delete=models.CASCADE, related_name='import_jobs')
+    file = models.FileField(upload_to='imports/')
+    content_type = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=IMPORT_JOB_STATUS_CHOICES, default='queued', db_index=True)
+    processed = models.PositiveIntegerField(default=0)
+    rows_per_sec = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    # удалить предложения поставщика, отсутствующие в прайсе
+    remove_missing = models.BooleanField(default=False)
+    # время последнего записанного пакета: задача без отметок дольше CLAIM_TIMEOUT считается брошенной
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = 'Задачи импорта'
+        ordering = ('created',)
 
 
+class OutgoingEmail(models.Model):
+    """
+    Письмо в очереди на отправку (goods.outbox). Записывается в той же транзакции, что и данные,
+    о которых оно сообщает, и отправляется фоновым обработчиком
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField()
+    status = models.CharField(max_length=20, choices=EMAIL_STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    # время следующей попытки; обработчик сдвигает его на время отправки, чтобы письмо не взял другой
+    next_attempt = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Исходящие письма'
+        ordering = ('id',)
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'], name='goods_email_queue_idx'),
+        ]
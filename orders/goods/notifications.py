@@ -0,0 +1,66 @@
+"""
+Уведомления о заказах
+
+Письма ставятся в очередь (goods.outbox) один раз при смене состояния заказа - оформлении
+и изменении статуса - в той же транзакции, что и само изменение. Просмотр заказа писем не отправляет.
+"""
+from django.conf import settings
+
+from .models import STATUS_CHOICES, User
+from .outbox import queue_mail, queue_mass_mail
+
+
+STATUS_NAMES = dict(STATUS_CHOICES)
+
+
+def _lines_text(lines):
+    return ''.join(f"{line.product}, поставщик - {line.distributor}, "
+                   f"количество - {line.quantity}, сумма - {line.sum} \n" for line in lines)
+
+
+def notify_order_created(order):
+    """
+    Письма покупателю и администратору об оформленном заказе
+    :param order: OrderMeta с загруженным order_confirmation__address
+    """
+    confirmation = order.order_confirmation
+    address = confirmation.address
+    lines_text = _lines_text(order.lines.all())
+
+    # Параметры для отправки email с параметрами заказа для клиента
+    message = f"Спасибо за заказ \n" \
+              f"Параметры заказа:\n" \
+              f"Номер заказа - {order.id}\n" \
+              f"Ваш заказ: \n" \
+              f"{lines_text}" \
+              f"Итоговая цена - {order.total_price}"
+    queue_mail(f'Ваш заказ № {order.id} принят', message, settings.EMAIL_HOST_USER, [confirmation.email])
+
+    # Рассылка нового заказа на почту администратора
+    admin_email = User.objects.filter(is_superuser=True).order_by('id').values_list('email', flat=True).first()
+    if admin_email is None:
+        return
+    message_to_admin = f"Поступил новый заказ \n" \
+                       f"Параметры заказа: \n" \
+                       f"Номер заказа - № {order.id} \n" \
+                       f"{lines_text}" \
+                       f"Покупатель - {confirmation.last_name} {confirmation.first_name} " \
+                       f"{confirmation.middle_name} \n" \
+                       f"Итоговая цена - {order.total_price} \n" \
+                       f"Адрес - {address.city} {address.street}, " \
+                       f"building - {address.building}, office - {address.office}"
+    queue_mail(f'Новый заказ № {order.id}', message_to_admin, settings.EMAIL_HOST_USER, [admin_email])
+
+
+def notify_status_changed(orders):
+    """
+    Письма покупателям об изменении статуса заказов, одним INSERT в очередь
+    :param orders: iterable - OrderMeta с загруженным order_confirmation
+    """
+    queue_mass_mail(
+        (f'Статус заказа № {order.id} изменен',
+         f"Статус вашего заказа № {order.id} - {STATUS_NAMES.get(order.status, order.status)} \n"
+         f"Итоговая цена - {order.total_price}",
+         settings.EMAIL_HOST_USER,
+         [order.order_confirmation.email])
+        for order in orders)
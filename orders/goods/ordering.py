@@ -0,0 +1,134 @@
+"""
+Оформление заказов
+
+Заказ объединяет несколько строк корзины, в том числе от разных поставщиков. Остатки всех
+предложений заказа резервируются одним условным UPDATE ... WHERE quantity >= n в той же
+транзакции, что и создание заказа: если хотя бы одного товара не хватает, заказ не создается
+и остатки не меняются, поэтому параллельные покупатели не могут купить больше, чем есть.
+
+Строки корзины и предложения блокируются (SELECT ... FOR NO KEY UPDATE) в порядке id: заказы
+с пересекающимися предложениями ждут друг друга, а не попадают во взаимную блокировку,
+а строку корзины нельзя изменить или оформить повторно, пока заказ не записан.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from rest_framework import serializers
+
+from .cache import touch_products
+from .models import Basket, OrderLine, OrderMeta, ProductDistributor
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def lock_offers(offer_ids):
+    """
+    Блокировка предложений в порядке id: UPDATE с CASE обходит строки в произвольном порядке.
+    FOR NO KEY UPDATE не мешает вставке строк корзины, ссылающихся на эти предложения
+    """
+    list(ProductDistributor.objects.select_for_update(no_key=True).filter(pk__in=offer_ids).order_by(
+        'pk').values_list('pk', flat=True))
+
+
+def reserve_stock(quantities):
+    """
+    Списание остатков предложений одним запросом. Выполняется внутри транзакции заказа
+    :param quantities: dict - {id предложения: количество}
+    """
+    if not quantities:
+        return
+    try:
+        with transaction.atomic():
+            lock_offers(quantities)
+            condition = Q()
+            for offer_id, quantity in quantities.items():
+                condition |= Q(pk=offer_id, quantity__gte=quantity)
+            updated = ProductDistributor.objects.filter(condition).update(quantity=Case(
+                *[When(pk=offer_id, then=F('quantity') - quantity) for offer_id, quantity in quantities.items()]))
+            if updated != len(quantities):
+                raise OutOfStock
+    except OutOfStock:
+        # списание отменено, в сообщении - товары, которых не хватило
+        short = [f'{product} (max quantity is {available})' for offer_id, product, available in
+                 ProductDistributor.objects.filter(pk__in=quantities).values_list('id', 'product__name', 'quantity')
+                 if available < quantities[offer_id]]
+        raise serializers.ValidationError(f'Not enough items: {", ".join(short)}')
+
+
+def _order_quantities(order):
+    # количество по предложениям строк заказа и товары этих предложений
+    quantities = defaultdict(int)
+    products = set()
+    for offer_id, product_id, quantity in order.lines.filter(offer__isnull=False).values_list(
+            'offer_id', 'offer__product_id', 'quantity'):
+        quantities[offer_id] += quantity
+        products.add(product_id)
+    return quantities, products
+
+
+def release_stock(order):
+    """
+    Возврат остатков по строкам заказа, например при отмене
+    """
+    quantities, products = _order_quantities(order)
+    if not quantities:
+        return
+    lock_offers(quantities)
+    ProductDistributor.objects.filter(pk__in=quantities).update(quantity=Case(
+        *[When(pk=offer_id, then=F('quantity') + quantity) for offer_id, quantity in quantities.items()]))
+    touch_products(products)
+
+
+def reserve_order_stock(order):
+    """
+    Повторное резервирование остатков по строкам отмененного заказа при его возобновлении.
+    Если предложение снято или товара уже не хватает, возникает ValidationError и остатки не меняются
+    """
+    missing = order.lines.filter(offer__isnull=True).values_list('product', flat=True).first()
+    if missing is not None:
+        raise serializers.ValidationError(f'The offer for {missing} is no longer available')
+    quantities, products = _order_quantities(order)
+    reserve_stock(quantities)
+    touch_products(products)
+
+
+def place_order(confirmation, basket_ids):
+    """
+    Оформление заказа из строк корзины. Выполняется внутри транзакции вместе с созданием
+    подтверждения заказа
+    :param confirmation: OrderConfirmation
+    :param basket_ids: list - id строк корзины
+    :return: OrderMeta
+    """
+    baskets = list(Basket.objects.select_for_update(of=('self',), no_key=True).filter(
+        pk__in=basket_ids).select_related('offer').order_by('pk'))
+    if len(baskets) != len(set(basket_ids)):
+        raise serializers.ValidationError('Basket lines do not exist')
+    # проверка после блокировки видит заказы, оформленные параллельно
+    if OrderLine.objects.filter(basket__in=baskets).exists():
+        raise serializers.ValidationError('Basket lines are already ordered')
+    for basket in baskets:
+        if basket.offer is None:
+            raise serializers.ValidationError(f'The offer for {basket.product} is no longer available')
+
+    quantities = defaultdict(int)
+    for basket in baskets:
+        quantities[basket.offer_id] += basket.quantity
+    reserve_stock(quantities)
+
+    order = OrderMeta.objects.create(basket=baskets[0] if len(baskets) == 1 else None,
+                                     order_confirmation=confirmation,
+                                     status='new',
+                                     total_price=sum(basket.total_price for basket in baskets))
+    OrderLine.objects.bulk_create([
+        OrderLine(order=order, basket=basket, offer=basket.offer, product=basket.product,
+                  distributor=basket.distributor, price=basket.price, quantity=basket.quantity, sum=basket.sum,
+                  total_price=basket.total_price)
+        for basket in baskets])
+
+    # остатки в карточках товаров изменились
+    touch_products({basket.offer.product_id for basket in baskets})
+    return order
@@ -0,0 +1,172 @@
+"""
+Очередь исходящих писем
+
+Представления не отправляют письма сами, а записывают их в модель OutgoingEmail в той же
+транзакции, что и данные: медленный или недоступный SMTP-сервер не задерживает и не ломает
+ответ API, а письмо о несохраненных данных не уйдет. Очередь разбирает локальный пул потоков
+веб-процесса после фиксации транзакции (EMAIL_OUTBOX_WORKERS) или отдельный процесс
+manage.py send_queued_mail. Письма пакета (EMAIL_OUTBOX_BATCH_SIZE) отправляются через одно
+SMTP-соединение, поэтому сотни уведомлений не платят за TLS-рукопожатие каждое; неудачные
+повторяются с растущей задержкой.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+# время, на которое захваченные письма скрываются от других обработчиков; если обработчик
+# завершился аварийно, письма снова попадут в очередь
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+_executor = None
+_lock = threading.Lock()
+# разбор очереди уже передан в пул и еще не начат: повторно его не планируем
+_scheduled = False
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """
+    Постановка письма в очередь, аргументы - как у django.core.mail.send_mail
+    :return: OutgoingEmail
+    """
+    email = OutgoingEmail.objects.create(subject=subject, body=message, from_email=from_email or '',
+                                         recipients=list(recipient_list))
+    transaction.on_commit(submit_outbox)
+    return email
+
+
+def queue_mass_mail(datatuple):
+    """
+    Постановка в очередь многих писем одним INSERT, аргумент - как у django.core.mail.send_mass_mail
+    :param datatuple: iterable - (subject, message, from_email, recipient_list)
+    :return: list - OutgoingEmail
+    """
+    emails = OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(subject=subject, body=message, from_email=from_email or '', recipients=list(recipient_list))
+        for subject, message, from_email, recipient_list in datatuple])
+    if emails:
+        transaction.on_commit(submit_outbox)
+    return emails
+
+
+def claim_emails(batch_size=None):
+    """
+    Захват пакета писем, которые пора отправить. Строки, захваченные параллельным
+    обработчиком, пропускаются (SKIP LOCKED)
+    :return: list - OutgoingEmail
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+            status='queued', next_attempt__lte=now).order_by('id')[:batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE])
+        if emails:
+            OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                next_attempt=now + CLAIM_TIMEOUT)
+    return emails
+
+
+def send_emails(emails):
+    """
+    Отправка пакета писем через одно соединение почтового бэкенда
+    :return: int - количество отправленных писем
+    """
+    mail_connection = get_connection()
+    pending = list(emails)
+    try:
+        while pending:
+            try:
+                mail_connection.open()
+            except Exception as error:
+                for email in pending:
+                    _failed(email, error)
+                break
+            for index, email in enumerate(pending):
+                try:
+                    mail_connection.send_messages([EmailMessage(email.subject, email.body, email.from_email or None,
+                                                                email.recipients)])
+                except Exception as error:
+                    _failed(email, error)
+                    # после ошибки соединение может быть разорвано, остаток пакета - через новое
+                    mail_connection.close()
+                    pending = pending[index + 1:]
+                    break
+                email.status, email.sent, email.error = 'sent', timezone.now(), ''
+                email.attempts += 1
+            else:
+                pending = []
+    finally:
+        mail_connection.close()
+
+    OutgoingEmail.objects.bulk_update(emails, ['status', 'attempts', 'next_attempt', 'error', 'sent'])
+    return sum(email.status == 'sent' for email in emails)
+
+
+def _failed(email, error):
+    # повтор через EMAIL_OUTBOX_RETRY_DELAY, 2 * EMAIL_OUTBOX_RETRY_DELAY, ... секунд
+    email.attempts += 1
+    email.error = repr(error)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.next_attempt = timezone.now() + timedelta(
+            seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1))
+
+
+def process_outbox(batch_size=None):
+    """
+    Захват и отправка одного пакета писем
+    :return: tuple - (захвачено, отправлено)
+    """
+    emails = claim_emails(batch_size)
+    if not emails:
+        return 0, 0
+    return len(emails), send_emails(emails)
+
+
+def drain_outbox(batch_size=None):
+    """
+    Отправка всех писем, которые пора отправить
+    :return: int - количество отправленных писем
+    """
+    total = 0
+    while True:
+        claimed, sent = process_outbox(batch_size)
+        if not claimed:
+            return total
+        total += sent
+
+
+def submit_outbox():
+    """
+    Разбор очереди в пуле потоков текущего процесса. При EMAIL_OUTBOX_WORKERS = 0 письма
+    остаются в очереди для manage.py send_queued_mail
+    """
+    global _executor, _scheduled
+    if not settings.EMAIL_OUTBOX_WORKERS:
+        return
+    with _lock:
+        if _scheduled:
+            return
+        _scheduled = True
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.EMAIL_OUTBOX_WORKERS, thread_name_prefix='outbox')
+    _executor.submit(_drain_in_thread)
+
+
+def _drain_in_thread():
+    global _scheduled
+    # письма, записанные после этой точки, заберет уже следующий разбор
+    with _lock:
+        _scheduled = False
+    try:
+        drain_outbox()
+    finally:
+        # у каждого потока пула свое соединение с БД
+        connection.close()
@@ -0,0 +1,12 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация списка товаров по id: стоимость запроса страницы не зависит от ее номера
+    """
+    ordering = 'id'
+    page_size = settings.PRODUCTS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PRODUCTS_MAX_PAGE_SIZE
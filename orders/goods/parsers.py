@@ -0,0 +1,131 @@
+"""
+Потоковый разбор прайс-листов
+
+Позиции раздела goods читаются из потока по одной, поэтому расход памяти определяется
+размером пакета импорта, а не размером файла.
+"""
+import json
+
+import yaml
+from yaml.events import AliasEvent, MappingEndEvent, MappingStartEvent, ScalarEvent, SequenceEndEvent, \
+    SequenceStartEvent, StreamEndEvent
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+from .pricelist import PriceListError
+
+
+NDJSON_MEDIA_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-lines')
+
+# при наличии libyaml события разбираются C-парсером
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def iter_yaml_goods(stream):
+    """
+    Событийный разбор YAML в формате shop1.yaml: позиции раздела goods отдаются по одной,
+    остальные разделы (shop, categories) пропускаются
+    :param stream: файлоподобный объект
+    :return: generator
+    """
+    loader = YAML_LOADER(stream)
+    anchors = {}
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(StreamEndEvent):
+            raise PriceListError('Price list has no goods')
+        loader.get_event()  # DocumentStartEvent
+        if not loader.check_event(MappingStartEvent):
+            raise PriceListError('Incorrect price list')
+        loader.get_event()
+
+        found = False
+        while not loader.check_event(MappingEndEvent):
+            key = _construct_next(loader, anchors)
+            if key == 'goods':
+                if not loader.check_event(SequenceStartEvent):
+                    raise PriceListError('Price list has no goods')
+                found = True
+                loader.get_event()
+                while not loader.check_event(SequenceEndEvent):
+                    yield _construct_next(loader, anchors)
+                loader.get_event()
+            else:
+                _construct_next(loader, anchors)
+        # без раздела goods (например, опечатка в ключе) импорт удалил бы все предложения поставщика
+        if not found:
+            raise PriceListError('Price list has no goods')
+    except yaml.YAMLError:
+        raise PriceListError('Incorrect price list')
+    finally:
+        loader.dispose()
+
+
+def _construct_next(loader, anchors):
+    # построение только очередного узла, а не всего документа
+    return loader.construct_document(_compose_node(loader, anchors))
+
+
+def _compose_node(loader, anchors):
+    """
+    Сборка узла из событий парсера. Composer из PyYAML недоступен в C-загрузчике,
+    поэтому узлы собираются здесь по тем же правилам
+    """
+    event = loader.get_event()
+    if isinstance(event, AliasEvent):
+        return anchors[event.anchor]
+
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+    elif isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(_compose_node(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(MappingEndEvent):
+            key = _compose_node(loader, anchors)
+            node.value.append((key, _compose_node(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise PriceListError('Incorrect price list')
+
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def iter_ndjson_goods(stream):
+    """
+    Разбор NDJSON: каждая непустая строка - одна позиция раздела goods
+    :param stream: файлоподобный объект
+    :return: generator
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise PriceListError(f'Incorrect line {number}')
+
+
+def iter_goods(stream, content_type):
+    """
+    Выбор потокового парсера по типу содержимого
+    """
+    if stream is None:
+        return iter(())
+    if content_type.split(';')[0].strip() in NDJSON_MEDIA_TYPES:
+        return iter_ndjson_goods(stream)
+    return iter_yaml_goods(stream)
@@ -0,0 +1,119 @@
+"""
+Проверка и нормализация позиций прайс-листа
+
+Модуль не зависит от Django, чтобы его функции можно было выполнять в дочерних процессах
+без настройки приложения.
+"""
+import hashlib
+import json
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+
+
+# ограничения длины совпадают с полями Product.name, Parameter.name и ProductParameter.value
+NAME_MAX_LENGTH = 100
+PARAMETER_MAX_LENGTH = 50
+
+# денежные поля хранятся как DecimalField(max_digits=12, decimal_places=2)
+MONEY_PLACES = Decimal('0.01')
+MONEY_MAX = Decimal('1e10')
+
+
+class PriceListError(ValueError):
+    """
+    Ошибка в данных прайс-листа
+    """
+
+
+def chunked(iterable, size):
+    """
+    Разбиение последовательности на списки длиной не более size
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def normalize_item(item):
+    """
+    Проверка и приведение одной позиции прайса к виду, пригодному для записи в БД
+    :param item: dict - позиция из раздела goods
+    :return: dict
+    """
+    if not isinstance(item, dict):
+        raise PriceListError('Incorrect item')
+    name = str(item.get('name') or '').strip()
+    if not name or len(name) > NAME_MAX_LENGTH:
+        raise PriceListError('Incorrect item')
+
+    # Проверка, что поля цен валидны
+    price = to_money(item.get('price'))
+    price_rrc = to_money(item.get('price_rrc'))
+    if price_rrc <= price:
+        raise PriceListError('Incorrect prices')
+
+    # количество - целое неотрицательное число (bool в Python - подкласс int)
+    quantity = item.get('quantity')
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 0:
+        raise PriceListError('Incorrect quantity')
+
+    raw_parameters = item.get('parameters') or {}
+    if not isinstance(raw_parameters, dict):
+        raise PriceListError('Incorrect parameters')
+    parameters = {}
+    for key, value in raw_parameters.items():
+        key, value = str(key).strip(), str(value).strip()
+        if not key or len(key) > PARAMETER_MAX_LENGTH or len(value) > PARAMETER_MAX_LENGTH:
+            raise PriceListError('Incorrect parameters')
+        parameters[key] = value
+    row = {
+        'name': name,
+        'price': price,
+        'delivery_price': price_rrc - price,
+        'quantity': quantity,
+        'parameters': parameters,
+    }
+    row['hash'] = content_hash(row)
+    return row
+
+
+def to_money(value):
+    """
+    Приведение цены к Decimal с точностью до копеек
+    :return: Decimal
+    """
+    if value is None or isinstance(value, bool):
+        raise PriceListError('Incorrect prices')
+    try:
+        money = Decimal(str(value)).quantize(MONEY_PLACES, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        raise PriceListError('Incorrect prices')
+    if not money.is_finite() or abs(money) >= MONEY_MAX:
+        raise PriceListError('Incorrect prices')
+    return money
+
+
+def content_hash(row):
+    """
+    Хеш содержимого позиции: цены, количество и параметры
+    """
+    content = json.dumps([float(row['price']), float(row['delivery_price']), row['quantity'],
+                          sorted(row['parameters'].items())], ensure_ascii=False)
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def normalize_items(items, start=1):
+    """
+    Нормализация списка позиций. Выполняется в том числе в дочерних процессах пула
+    :param start: int - номер первой позиции списка в прайсе, выводится в тексте ошибки
+    """
+    rows = []
+    for number, item in enumerate(items, start):
+        try:
+            rows.append(normalize_item(item))
+        except PriceListError as error:
+            raise PriceListError(f'{error} in row {number}')
+    return rows
@@ -0,0 +1,114 @@
+"""
+Расчет строк корзины
+
+Предложение поставщика (товар, поставщик, цена, остаток) получается одним запросом с JOIN -
+по id (Basket.offer) или по наименованию товара и фамилии поставщика - и передается
+из validate() в create()/update() сериализатора через validated_data['offer'].
+При пакетном добавлении предложения для всех строк загружаются одним запросом.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from .models import Basket, ProductDistributor
+
+
+# предложения вместе с товаром и поставщиком, достаточные для проверки и расчета строки корзины
+OFFERS = ProductDistributor.objects.select_related('product', 'distributor__user')
+
+
+def get_offers(pairs):
+    """
+    Предложения поставщиков для набора пар (товар, поставщик) одним запросом
+    :param pairs: iterable - (наименование товара, фамилия поставщика)
+    :return: dict - {(товар, поставщик): [ProductDistributor, ...]}
+    """
+    offers = {pair: [] for pair in pairs}
+    if not offers:
+        return offers
+    for offer in OFFERS.filter(
+            product__name__in={product for product, _ in offers},
+            distributor__user__last_name__in={distributor for _, distributor in offers}).order_by('id'):
+        key = (offer.product.name, offer.distributor.user.last_name)
+        if key in offers:
+            offers[key].append(offer)
+    return offers
+
+
+def get_offer(product, distributor, offers=None):
+    """
+    Предложение поставщика на товар
+    :param product: str - наименование товара
+    :param distributor: str - фамилия поставщика (Basket.distributor)
+    :param offers: dict - результат get_offers, если предложения уже загружены
+    :return: ProductDistributor с загруженными product, distributor и distributor.user
+    """
+    if offers is None:
+        offers = get_offers([(product, distributor)])
+    found = offers.get((product, distributor))
+    if not found:
+        raise serializers.ValidationError(f'{distributor} has no offer for {product}')
+    if len(found) > 1:
+        raise serializers.ValidationError(f'Ambiguous offer for {product} from {distributor}')
+    return found[0]
+
+
+def check_offer(offer, quantity=None):
+    """
+    Проверка, что поставщик принимает заказы и у него достаточно товара
+    """
+    # Проверка, что пользователь является дистрибьютором
+    if offer.distributor.user.type != 'distributor':
+        raise serializers.ValidationError('The user is not distributor')
+
+    # Проверка, что дистрибьютор готов принимать заказы
+    if not offer.distributor.status:
+        raise serializers.ValidationError('Now the distributor is unavailable')
+
+    # Проверка достаточного количества товара от дистрибьютора, что выполнить заказ
+    if quantity and quantity > offer.quantity:
+        raise serializers.ValidationError(f'Not enough items, max quantity is {offer.quantity}')
+
+
+def price_line(offer, quantity):
+    """
+    Расчетные поля строки корзины
+    :return: dict - price, sum, total_price
+    """
+    line_sum = quantity * offer.price
+    return {
+        'price': offer.price,
+        'sum': line_sum,
+        'total_price': line_sum + offer.delivery_price,
+    }
+
+
+def build_basket_lines(lines):
+    """
+    Проверка и расчет строк корзины для пакетного добавления
+    :param lines: list - проверенные данные строк (offer или product и distributor, quantity)
+    :return: list - несохраненный Basket или ValidationError для каждой строки
+    """
+    # предложения по id и по наименованиям загружаются двумя запросами на весь пакет
+    by_id = OFFERS.in_bulk([line['offer'] for line in lines if line.get('offer')])
+    offers = get_offers((line['product'], line['distributor']) for line in lines if not line.get('offer'))
+
+    # остаток проверяется с учетом всех строк запроса на одно предложение
+    reserved = defaultdict(int)
+    results = []
+    for line in lines:
+        try:
+            if line.get('offer'):
+                offer = by_id.get(line['offer'])
+                if offer is None:
+                    raise serializers.ValidationError(f"Offer {line['offer']} does not exist")
+            else:
+                offer = get_offer(line['product'], line['distributor'], offers)
+            check_offer(offer, reserved[offer.id] + line['quantity'])
+        except serializers.ValidationError as error:
+            results.append(error)
+            continue
+        reserved[offer.id] += line['quantity']
+        results.append(Basket(offer=offer, product=offer.product.name, distributor=offer.distributor.user.last_name,
+                              quantity=line['quantity'], **price_line(offer, line['quantity'])))
+    return results
@@ -1,6 +1,10 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Product, ProductDistributor, Distributor, User, Basket, \
-    OrderConfirmation, Address, OrderMeta, OrderHistory
+from .models import Product, ProductDistributor, Basket, OrderConfirmation, Address, OrderMeta, OrderLine, \
+    OrderHistory, ImportJob
+from .notifications import notify_order_created, notify_status_changed
+from .ordering import place_order, release_stock, reserve_order_stock
+from .pricing import OFFERS, get_offer, check_offer, price_line
 
 
 class ProductDistributorSerializer(serializers.ModelSerializer):
@@ -9,7 +13,19 @@ class ProductDistributorSerializer(serializers.ModelSerializer):
         fields = ['distributor', 'price', 'delivery_price', 'quantity']
 
 
-class ProductParameterSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Миксин для вывода только запрошенных полей: Serializer(..., fields=['id', 'name'])
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ProductParameterSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     product_distributors = ProductDistributorSerializer(many=True)
     prod_parameters = serializers.StringRelatedField(many=True)
 
@@ -21,83 +37,77 @@ class ProductParameterSerializer(serializers.ModelSerializer):
 class BasketSerializer(serializers.ModelSerializer):
     """
     Сериализатор для работы с корзиной
+    Строка ссылается на предложение поставщика: offer (id ProductDistributor) или пара
+    product (наименование товара) и distributor (фамилия поставщика)
     """
+    offer = serializers.PrimaryKeyRelatedField(queryset=OFFERS, required=False)
+
     class Meta:
         model = Basket
-        fields = ['id', 'product', 'distributor', 'price', 'quantity', 'sum', 'total_price']
+        fields = ['id', 'offer', 'product', 'distributor', 'price', 'quantity', 'sum', 'total_price']
         read_only_fields = ['id', 'price', 'sum', 'total_price']
+        extra_kwargs = {'product': {'required': False}, 'distributor': {'required': False}}
 
     def create(self, validated_data):
 
-        # Получить набор данных из БД для сопоставления записей в корзине с таблицей Product и Distributor
-        product = Product.objects.get(name=validated_data['product'])
-        user = User.objects.get(last_name=validated_data['distributor'])
-        distributor = Distributor.objects.get(user=user.id)
-
-        # Получить стоимость доставки для расчета read_only_fields
-        delivery_price = ProductDistributor.objects.filter(distributor=distributor).get(product=product).delivery_price
-        price = ProductDistributor.objects.filter(distributor=distributor).get(product=product).price
-
-        # Добавить недостающие записи в сериализатор
-        validated_data['price'] = price
-        validated_data['sum'] = validated_data['quantity'] * validated_data['price']
-        validated_data['total_price'] = validated_data['sum'] + delivery_price
+        # предложение поставщика получено в validate(), повторных запросов к БД нет
+        validated_data.update(price_line(validated_data['offer'], validated_data['quantity']))
 
         return Basket.objects.create(**validated_data)
 
     def update(self, instance, validated_data):
-        product = Product.objects.get(name=instance.product)
         instance.quantity = validated_data.get('quantity', instance.quantity)
-
-        # Проверка на случай, если поле distributor не передается в методе PATCH
-        if validated_data.get('distributor'):
-            user = User.objects.get(last_name=validated_data.get('distributor'))
-            instance.distributor = validated_data.get('distributor')
-        else:
-            user = User.objects.get(last_name=instance.distributor)
-        distributor = Distributor.objects.get(user=user.id)  # Получить distributor из БД
-
-        # получение недостающих данных из БД
-        delivery_price = ProductDistributor.objects.filter(distributor=distributor).get(product=product).delivery_price
-        price = ProductDistributor.objects.filter(distributor=distributor).get(product=product).price
+        instance.offer = validated_data['offer']
+        instance.product = validated_data['product']
+        instance.distributor = validated_data['distributor']
 
         # Сохранение расчетных данных в БД
-        instance.sum = instance.quantity * price
-        instance.total_price = instance.sum + delivery_price
+        for field, value in price_line(instance.offer, instance.quantity).items():
+            setattr(instance, field, value)
         instance.save()
 
         return instance
 
     def validate(self, attr):
 
-        # Получение предельного количества товаров для выбранного дистрибьютора для методов PATCH и POST
-        if self.context['request'].method == 'PATCH':
-            pk = self.context['request'].parser_context['kwargs']['pk']
-            prod_in_basket = Basket.objects.get(pk=pk).product
-            product = Product.objects.get(name=prod_in_basket).id
-            quantity_limit = ProductDistributor.objects.get(product=product).quantity
+        # предложение передано по id, задано наименованием товара и фамилией поставщика
+        # или (при PATCH) берется из изменяемой строки корзины
+        if attr.get('offer'):
+            offer = attr['offer']
+        elif attr.get('product') or attr.get('distributor'):
+            product = attr.get('product') or getattr(self.instance, 'product', None)
+            distributor = attr.get('distributor') or getattr(self.instance, 'distributor', None)
+            if not (product and distributor):
+                raise serializers.ValidationError('Offer or product and distributor are required')
+            offer = get_offer(product, distributor)
+        elif self.instance is not None and self.instance.offer is not None:
+            offer = self.instance.offer
+        elif self.instance is not None:
+            raise serializers.ValidationError('The offer is no longer available')
         else:
-            product = Product.objects.get(name=attr.get('product')).id
-            quantity_limit = ProductDistributor.objects.get(product=product).quantity
+            raise serializers.ValidationError('Offer or product and distributor are required')
+        check_offer(offer, attr.get('quantity'))
+
+        # предложение используется также в create() / update()
+        attr.update(offer=offer, product=offer.product.name, distributor=offer.distributor.user.last_name)
 
-        # проверка на наличие дистрибьютора в запросе
-        if attr.get('distributor'):
-            user = User.objects.get(last_name=attr.get('distributor'))
+        return attr
 
-            # Проверка, что пользователь является дистрибьютором
-            if user.type != 'distributor':
-                raise serializers.ValidationError('The user is not distributor')
-            distributor = Distributor.objects.get(user=user)
 
-            # Проверка, что дистрибьютор готов принимать заказы
-            if not distributor.status:
-                raise serializers.ValidationError('Now the distributor is unavailable')
+class BasketLineSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для проверки полей строки при пакетном добавлении в корзину, без запросов к БД
+    """
+    offer = serializers.IntegerField(required=False)
 
-        # Проверка достаточного количества товара от дистрибьютора, что выполнить заказ
-        if attr.get('quantity'):
-            if attr.get('quantity') > quantity_limit:
-                raise serializers.ValidationError(f'Not enough items, max quantity is {quantity_limit}')
+    class Meta:
+        model = Basket
+        fields = ['offer', 'product', 'distributor', 'quantity']
+        extra_kwargs = {'product': {'required': False}, 'distributor': {'required': False}}
 
+    def validate(self, attr):
+        if not attr.get('offer') and not (attr.get('product') and attr.get('distributor')):
+            raise serializers.ValidationError('Offer or product and distributor are required')
         return attr
 
 
@@ -113,28 +123,44 @@ class AddressSerializer(serializers.ModelSerializer):
 class OrderConfirmationSerializer(serializers.ModelSerializer):
     """
     Сериализатор для подтверждения заказа от покупателя
+    Заказ оформляется на одну строку корзины (basket) или на несколько (baskets)
     """
     address = AddressSerializer()
+    baskets = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False,
+                                    allow_empty=False)
+    order = serializers.IntegerField(source='ordermeta.id', read_only=True)
 
     class Meta:
         model = OrderConfirmation
-        fields = ['last_name', 'first_name', 'middle_name', 'email', 'phone', 'address', 'basket']
+        fields = ['last_name', 'first_name', 'middle_name', 'email', 'phone', 'address', 'basket', 'baskets',
+                  'order']
+
+    def validate(self, attr):
+        if not attr.get('baskets') and not attr.get('basket'):
+            raise serializers.ValidationError('Basket or baskets are required')
+        return attr
 
     def create(self, validated_data):
-        is_existing_customer = OrderConfirmation.objects.filter(email=validated_data['email']).exists()
+        basket_ids = validated_data.pop('baskets', None) or [validated_data['basket']]
+        validated_data['basket'] = basket_ids[0] if len(basket_ids) == 1 else None
         address_data = validated_data.pop('address')
 
-        # Проверка, чтобы избежать многократной записи одинаковых адресов в модель Address
-        if is_existing_customer:
-            previous_order = OrderConfirmation.objects.filter(email=validated_data['email']).first()
-            address = previous_order.address
-        else:
-            address = Address.objects.create(**address_data)
-        basket = Basket.objects.get(id=validated_data['basket'])
-        confirmation = OrderConfirmation.objects.create(address=address, **validated_data)
-        OrderMeta.objects.create(basket=basket,
-                                 order_confirmation=confirmation,
-                                 status='new')
+        # подтверждение, заказ, его строки и резервирование остатков - в одной транзакции
+        try:
+            with transaction.atomic():
+                # Проверка, чтобы избежать многократной записи одинаковых адресов в модель Address
+                previous_order = OrderConfirmation.objects.filter(email=validated_data['email']).select_related(
+                    'address').first()
+                if previous_order is not None:
+                    address = previous_order.address
+                else:
+                    address = Address.objects.create(**address_data)
+                confirmation = OrderConfirmation.objects.create(address=address, **validated_data)
+                order = place_order(confirmation, basket_ids)
+                notify_order_created(order)
+        except IntegrityError:
+            # те же строки корзины одновременно оформлены в другой заказ
+            raise serializers.ValidationError('Basket lines are already ordered')
 
         return confirmation
 
@@ -148,18 +174,38 @@ class OrderChangeStatusSerializer(serializers.ModelSerializer):
         model = OrderMeta
         fields = ['status']
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        # статус перечитывается под блокировкой: параллельная отмена не вернет остатки дважды
+        instance.status = OrderMeta.objects.select_for_update(no_key=True).values_list('status', flat=True).get(
+            pk=instance.pk)
 
         # в модель OrderHistory сохраняется только та информация о заказах, которым присвоен статус "доставлен"
         # или "отменен"
         if validated_data['status'] in ['cancelled', 'delivered']:
-            result_price = instance.basket.total_price
-            OrderHistory.objects.get_or_create(result_price=result_price,
-                                               order=instance,
-                                               order_confirmation=validated_data['status'])
+            result_price = instance.total_price
+            # у заказа одна запись истории с последним итоговым статусом
+            OrderHistory.objects.update_or_create(order=instance,
+                                                  defaults={'result_price': result_price,
+                                                            'order_confirmation': validated_data['status']})
+        else:
+            # возобновленный заказ больше не закрыт
+            OrderHistory.objects.filter(order=instance).delete()
+
+        # при отмене еще не доставленного заказа зарезервированные остатки возвращаются поставщикам
+        if validated_data['status'] == 'cancelled' and instance.status in ['new', 'paid']:
+            release_stock(instance)
+        # возобновленный отмененный заказ снова резервирует остатки, иначе повторная отмена вернула бы их дважды
+        elif instance.status == 'cancelled' and validated_data['status'] != 'cancelled':
+            reserve_order_stock(instance)
+        status_changed = validated_data.get('status', instance.status) != instance.status
         instance.status = validated_data.get('status', instance.status)
         instance.save()
 
+        # покупатель получает письмо только при фактической смене статуса
+        if status_changed:
+            notify_status_changed([instance])
+
         return instance
 
 
@@ -172,16 +218,27 @@ class PriceForOrderMetaSerializer(serializers.ModelSerializer):
         fields = ['total_price']
 
 
+class OrderLineSerializer(serializers.ModelSerializer):
+    """
+    Serializer для вывода строк заказа
+    """
+    class Meta:
+        model = OrderLine
+        fields = ['offer', 'product', 'distributor', 'price', 'quantity', 'sum', 'total_price']
+        read_only_fields = fields
+
+
 class OrderMetaSerializer(serializers.ModelSerializer):
     """
     Serializer для вывода информации о заказах
     """
     basket = PriceForOrderMetaSerializer()
+    lines = OrderLineSerializer(many=True)
 
     class Meta:
         model = OrderMeta
-        fields = ['id', 'date', 'basket', 'status']
-        read_only_fields = ['id', 'date', 'basket', 'status']
+        fields = ['id', 'date', 'basket', 'status', 'total_price', 'lines']
+        read_only_fields = ['id', 'date', 'basket', 'status', 'total_price', 'lines']
 
 
 class OrderHistorySerializer(serializers.ModelSerializer):
@@ -193,3 +250,14 @@ class OrderHistorySerializer(serializers.ModelSerializer):
         model = OrderHistory
         fields = ['id', 'order', 'order_confirmation', 'result_price']
         read_only_fields = ['id', 'order', 'order_confirmation', 'result_price']
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer для вывода состояния фонового импорта прайса
+    """
+
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'status', 'processed', 'rows_per_sec', 'error', 'created', 'started', 'finished']
+        read_only_fields = fields
@@ -0,0 +1,56 @@
+"""
+Обновление времени изменения товаров и сброс кеша карточек при изменении данных через ORM
+(админка, shell, сериализаторы). Пакетный импорт прайса сигналов не вызывает и делает это
+сам (PriceListImporter). Сброс кеша токенов при удалении токена и изменении пользователя
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .cache import invalidate_catalog, invalidate_products, touch_products
+from .models import Product, Parameter, ProductParameter, ProductDistributor, User
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    invalidate_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # max(modified) не меняется при удалении товара: ETag списка меняет версия каталога
+    invalidate_catalog()
+
+
+@receiver([post_save, post_delete], sender=ProductDistributor)
+@receiver([post_save, post_delete], sender=ProductParameter)
+def product_data_changed(sender, instance, **kwargs):
+    product_id = instance.product_id if sender is ProductDistributor else instance.product_name_id
+    touch_products([product_id])
+    if sender is ProductParameter:
+        # параметры не сравниваются при импорте по значениям: сброс хеша, чтобы импорт записал их заново
+        ProductDistributor.objects.filter(product_id=product_id).update(content_hash='')
+
+
+@receiver(post_save, sender=Parameter)
+def parameter_changed(sender, instance, created, **kwargs):
+    # переименование параметра меняет карточки всех товаров с этим параметром
+    if not created:
+        touch_products(ProductParameter.objects.filter(parameter_name=instance).values_list(
+            'product_name_id', flat=True).distinct())
+
+
+@receiver([post_save, post_delete], sender=Token)
+def token_changed(sender, instance, **kwargs):
+    # после фиксации, чтобы параллельный запрос не вернул в кеш старые данные;
+    # ключ запоминается сразу - после удаления первичный ключ объекта сбрасывается в None
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.delete(key))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: token_cache.delete_user(user_id))
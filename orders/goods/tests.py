@@ -1,3 +1,247 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .loadtest import place_order
+from .models import Address, Distributor, OrderConfirmation, OrderLine, OrderMeta, Parameter, Product, \
+    ProductDistributor, ProductParameter, User
+
+
+class ProductQueriesTestCase(TestCase):
+    """
+    Количество запросов списка и карточки товара не зависит от размера каталога
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        distributors = [Distributor.objects.create(user=User.objects.create_user(
+            email=f'distributor{index}@example.com', last_name=f'Distributor {index}', type='distributor'))
+            for index in range(2)]
+        self.parameters = [Parameter.objects.create(name=name) for name in ('Цвет', 'Память')]
+        self.distributors = distributors
+
+    def create_products(self, count):
+        products = Product.objects.bulk_create([Product(name=f'Product {index}') for index in range(count)])
+        ProductDistributor.objects.bulk_create([
+            ProductDistributor(product=product, distributor=distributor, price=100, quantity=5)
+            for product in products for distributor in self.distributors])
+        ProductParameter.objects.bulk_create([
+            ProductParameter(product_name=product, parameter_name=parameter, value='1')
+            for product in products for parameter in self.parameters])
+        return products
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_list_queries_do_not_depend_on_catalog_size(self):
+        self.create_products(2)
+        queries = self.count_queries('/products/')
+
+        self.create_products(48)
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get('/products/')
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_detail_queries_do_not_depend_on_catalog_size(self):
+        product = self.create_products(2)[0]
+        queries = self.count_queries(f'/products/{product.id}/')
+
+        self.create_products(48)
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get(f'/products/{product.id}/')
+        self.assertEqual(len(response.data['product_distributors']), 2)
+        self.assertEqual(len(response.data['prod_parameters']), 2)
+
+
+
+class CatalogETagTestCase(TestCase):
+    """
+    Условный запрос списка товаров
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = Product.objects.bulk_create([Product(name=f'Product {index}') for index in range(3)])
+
+    def test_not_modified_without_counting_products(self):
+        etag = self.client.get('/products/')['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('COUNT', context.captured_queries[0]['sql'].upper())
+
+    def test_deleted_product_changes_etag(self):
+        etag = self.client.get('/products/')['ETag']
+        # удаляется не последний измененный товар: max(modified) остается прежним
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].delete()
+        response = self.client.get('/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PartnerImportTestCase(TestCase):
+    """
+    Загрузка прайса поставщика через /export/
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(email='distributor@example.com', last_name='Distributor', type='distributor')
+        self.distributor = Distributor.objects.create(user=user)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def upload(self, names, query=''):
+        body = '\n'.join(json.dumps({'name': name, 'price': 100, 'price_rrc': 110, 'quantity': 5})
+                         for name in names)
+        return self.client.post(f'/export/{query}', body, content_type='application/x-ndjson')
+
+    def offers(self):
+        return set(ProductDistributor.objects.filter(distributor=self.distributor)
+                   .values_list('product__name', flat=True))
+
+    def test_partial_upload_keeps_missing_offers(self):
+        self.upload(['Phone', 'Tablet'])
+        response = self.upload(['Phone'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['import']['removed'], 0)
+        self.assertEqual(self.offers(), {'Phone', 'Tablet'})
+
+    def test_remove_missing_offers(self):
+        self.upload(['Phone', 'Tablet'])
+        response = self.upload(['Phone'], '?remove_missing=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['import']['removed'], 1)
+        self.assertEqual(self.offers(), {'Phone'})
+
+
+    def test_remove_ordered_offer(self):
+        self.upload(['Phone', 'Tablet'])
+        offer = ProductDistributor.objects.get(distributor=self.distributor, product__name='Tablet')
+        confirmation = OrderConfirmation.objects.create(
+            last_name='Buyer', first_name='Buyer', middle_name='Buyer', email='buyer@example.com', phone='0',
+            address=Address.objects.create(city='City', street='Street', building='1', office='1'))
+        order = OrderMeta.objects.create(order_confirmation=confirmation, status='new', total_price=110)
+        line = OrderLine.objects.create(order=order, offer=offer, product='Tablet', distributor='Distributor',
+                                        price=110, quantity=1, sum=110, total_price=110)
+
+        response = self.upload(['Phone'], '?remove_missing=1')
+        self.assertEqual(response.status_code, 200)
+        connection.check_constraints()
+        # строка заказа остается с наименованием, но без ссылки на удаленное предложение
+        line.refresh_from_db()
+        self.assertIsNone(line.offer_id)
+        self.assertEqual(self.offers(), {'Phone'})
+
+
+
+class ImportPricelistCommandTestCase(TestCase):
+    """
+    Загрузка каталога прайсов командой import_pricelist
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(email='distributor@example.com', last_name='Distributor', type='distributor')
+        self.distributor = Distributor.objects.create(user=user)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        with open(os.path.join(self.directory.name, name), 'wb') as file:
+            file.write(content)
+
+    def test_files_with_same_products_and_failed_file(self):
+        for name in ('a.ndjson', 'b.ndjson'):
+            self.write(name, json.dumps({'name': 'Phone', 'price': 100, 'price_rrc': 110, 'quantity': 5,
+                                         'parameters': {'Цвет': 'черный'}}).encode())
+        # ошибка, отличная от PriceListError, не прерывает загрузку остальных файлов
+        os.mkdir(os.path.join(self.directory.name, 'c.yaml'))
+
+        with self.assertRaisesMessage(CommandError, 'c.yaml: IsADirectoryError'):
+            call_command('import_pricelist', self.directory.name, distributor='distributor@example.com',
+                         stdout=open(os.devnull, 'w'))
+        self.assertEqual(Product.objects.filter(name='Phone').count(), 1)
+        self.assertEqual(Parameter.objects.filter(name='Цвет').count(), 1)
+        self.assertEqual(ProductDistributor.objects.filter(distributor=self.distributor).count(), 1)
+
+    def test_benchmark_without_distributor(self):
+        self.write('a.ndjson', json.dumps({'name': 'Phone', 'price': 100, 'price_rrc': 110, 'quantity': 5}).encode())
+        with open(os.devnull, 'w') as stdout:
+            call_command('import_pricelist', self.directory.name, benchmark=True, workers=1, stdout=stdout)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Concurrent orders require PostgreSQL')
+@override_settings(EMAIL_OUTBOX_WORKERS=0)
+class ConcurrentOrdersTestCase(TransactionTestCase):
+    """
+    Параллельные заказы на одни и те же предложения: продано не больше остатка, остаток не бывает отрицательным.
+    Каждый поток работает через свое соединение с БД, поэтому нужна TransactionTestCase
+    """
+    threads = 16
+    orders_per_thread = 4
+    stock = 20
+
+    def setUp(self):
+        distributor = Distributor.objects.create(user=User.objects.create_user(
+            email='distributor@example.com', last_name='Distributor', type='distributor'))
+        self.offers = [ProductDistributor.objects.create(product=Product.objects.create(name=f'Product {index}'),
+                                                         distributor=distributor, price=10, quantity=self.stock).id
+                       for index in range(2)]
+
+    def place_orders(self, start):
+        api = APIClient(raise_request_exception=False)
+        start.wait()
+        try:
+            return [place_order(api, self.offers) for _ in range(self.orders_per_thread)]
+        finally:
+            connection.close()
+
+    def watch_stock(self, done, observed):
+        # остатки читаются, пока идут заказы
+        try:
+            while not done.is_set():
+                observed.extend(ProductDistributor.objects.filter(pk__in=self.offers).values_list(
+                    'quantity', flat=True))
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        start, done, observed = threading.Barrier(self.threads), threading.Event(), []
+        watcher = threading.Thread(target=self.watch_stock, args=(done, observed))
+        watcher.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                results = list(executor.map(self.place_orders, [start] * self.threads))
+        finally:
+            done.set()
+            watcher.join()
+
+        outcomes = [outcome for result in results for outcome in result]
+        self.assertEqual(set(outcomes) - {'ordered', 'rejected by basket', 'rejected by order'}, set())
+        self.assertEqual(outcomes.count('ordered'), self.stock)
+        self.assertGreaterEqual(min(observed), 0)
+
+        sold = dict(OrderLine.objects.values_list('offer').annotate(Sum('quantity')))
+        for offer_id, remaining in ProductDistributor.objects.filter(pk__in=self.offers).values_list('id', 'quantity'):
+            self.assertEqual(remaining, 0)
+            self.assertEqual(sold[offer_id], self.stock)
@@ -1,15 +1,40 @@
-from django.http import JsonResponse
+import hashlib
+import os
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework_yaml.parsers import YAMLParser
 from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
 from rest_framework.views import APIView
-from .models import User, Product, Parameter, ProductParameter, Distributor, ProductDistributor, Address, Basket, \
-    OrderConfirmation, OrderMeta, OrderHistory
-from .serializers import ProductParameterSerializer, BasketSerializer, OrderConfirmationSerializer, \
-    OrderMetaSerializer, OrderChangeStatusSerializer, OrderHistorySerializer
+from .models import User, Product, ProductParameter, Distributor, Address, Basket, \
+    OrderConfirmation, OrderMeta, OrderLine, OrderHistory, ImportJob
+from .authentication import login_blocked, login_failed, login_succeeded
+from .cache import get_catalog_version, get_product_payload, get_stats as get_cache_stats
+from .exporter import EXPORT_FORMATS, render_catalog
+from .filters import filter_products, get_facets
+from .importer import PriceListImporter
+from .jobs import submit_job
+from .outbox import queue_mail
+from .pagination import ProductCursorPagination
+from .parsers import NDJSON_MEDIA_TYPES, iter_goods
+from .pricelist import PriceListError
+from .pricing import build_basket_lines
+from .serializers import ProductParameterSerializer, BasketSerializer, BasketLineSerializer, \
+    OrderConfirmationSerializer, OrderMetaSerializer, OrderChangeStatusSerializer, OrderHistorySerializer, \
+    ImportJobSerializer
 from orders.settings import EMAIL_HOST_USER
 
 
@@ -20,7 +45,22 @@ class PartnerUpdate(APIView):
     parser_classes = [YAMLParser]
 
     def get(self, request):
-        return Response({'status': 'GET-OK'})
+        # Метод для выгрузки каталога поставщика: ?output=yaml (по умолчанию), jsonl или csv
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if request.user.type != 'distributor':
+            return JsonResponse({'Status': False, 'Error': 'Only for distributors'}, status=403)
+
+        output = request.query_params.get('output', 'yaml')
+        if output not in EXPORT_FORMATS:
+            return JsonResponse({'Status': False, 'Error': 'Incorrect output format'}, status=400)
+
+        distributor = Distributor.objects.select_related('user').get(user=request.user)
+        response = StreamingHttpResponse(render_catalog(distributor, output), content_type=EXPORT_FORMATS[output])
+        response['Content-Disposition'] = f'attachment; filename="catalog.{output}"'
+        return response
 
     def post(self, request, *args, **kwargs):
 
@@ -34,45 +74,80 @@ class PartnerUpdate(APIView):
 
         # получение объекта дистрибьютора
         distributor = Distributor.objects.get(user=request.user)
-        obj_good = request.data.get('goods')
-        number = 0
-        while number < len(obj_good):
-            # наполнение модели Product
-            product, _ = Product.objects.get_or_create(name=obj_good[number].get('name'))
-            product.name = obj_good[number].get('name')
-            # product.price_with_delivery = obj_good[number].get('price_rrc')
-            # product.quantity = obj_good[number].get('quantity')
-            product.save()
-
-            dict_with_parameters = obj_good[number].get('parameters')
-
-            # удаление старой записи в модели ProductParameter
-            ProductParameter.objects.filter(product_name=product.id).delete()
-
-            # цикл для заполнения моделей Parameter, ProductParameter
-            for key, value in dict_with_parameters.items():
-                parameter, _ = Parameter.objects.get_or_create(name=key)
-                ProductParameter.objects.create(product_name=product,
-                                                parameter_name=parameter,
-                                                value=value)
-
-            # Проверка, что поля цен валидны
-            if obj_good[number].get('price_rrc') <= obj_good[number].get('price'):
-                return JsonResponse({'Status': False, 'Error': 'Incorrect prices'}, status=400)
-
-            delivery_price = obj_good[number].get('price_rrc') - obj_good[number].get('price')
-
-            # удаление старой записи в модели ProductDistributor
-            ProductDistributor.objects.filter(product=product.id).delete()
-
-            # Наполнение модели ProductDistributor
-            ProductDistributor.objects.create(product=product,
-                                              distributor=distributor,
-                                              price=obj_good[number].get('price'),
-                                              quantity=obj_good[number].get('quantity'),
-                                              delivery_price=delivery_price)
-            number += 1
-        return Response({'status': 'POST-OK'})
+
+        # ?remove_missing=1 - прайс полный, предложения на отсутствующие в нем товары удаляются
+        remove_missing = bool(request.query_params.get('remove_missing'))
+
+        # фоновый импорт: прайс сохраняется в файл и ставится в очередь
+        if request.query_params.get('async'):
+            return self.enqueue(request, distributor, remove_missing)
+
+        # количество процессов для проверки позиций прайса, не больше числа ядер
+        workers = request.query_params.get('workers', '0')
+        if not workers.isdigit():
+            return JsonResponse({'Status': False, 'Error': 'Incorrect workers'}, status=400)
+        workers = min(int(workers), os.cpu_count() or 1)
+
+        # пакетный импорт позиций прайса в одной транзакции
+        try:
+            stats = PriceListImporter(distributor, workers=workers,
+                                      remove_missing=remove_missing).run(self.get_goods(request))
+        except PriceListError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+
+        return Response({'status': 'POST-OK', 'import': stats})
+
+    @staticmethod
+    def enqueue(request, distributor, remove_missing):
+        """
+        Сохранение загруженного прайса и постановка задачи импорта в очередь
+        """
+        if request.stream is None:
+            return JsonResponse({'Status': False, 'Error': 'Empty price list'}, status=400)
+
+        content_type = request.content_type.split(';')[0].strip()
+        extension = 'ndjson' if content_type in NDJSON_MEDIA_TYPES else 'yaml'
+        job = ImportJob(distributor=distributor, content_type=content_type, remove_missing=remove_missing)
+        job.file.save(f'{distributor.id}.{extension}', File(request.stream), save=False)
+        job.save()
+
+        # задача передается обработчику только после фиксации транзакции
+        transaction.on_commit(partial(submit_job, job.id))
+        return Response({'status': 'ACCEPTED', 'job': job.id}, status=202)
+
+    @staticmethod
+    def get_goods(request):
+        """
+        Получение позиций прайса. NDJSON и YAML с параметром ?stream=1 читаются из потока запроса
+        по одной позиции, иначе используется документ, целиком разобранный YAMLParser
+        """
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type in NDJSON_MEDIA_TYPES or request.query_params.get('stream'):
+            return iter_goods(request.stream, content_type)
+        # без раздела goods импорт удалил бы все предложения поставщика
+        goods = request.data.get('goods') if isinstance(request.data, dict) else None
+        if not isinstance(goods, list) or not goods:
+            raise PriceListError('Price list has no goods')
+        return goods
+
+
+class ImportJobAPIView(APIView):
+    """
+    Представление для вывода состояния фонового импорта прайса
+    """
+    def get(self, request, pk):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        # поставщик видит только свои задачи импорта
+        job = get_object_or_404(ImportJob, pk=pk, distributor__user=request.user)
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
+
+def is_owner(request, pk):
+    # токен запроса принадлежит пользователю pk; токен и пользователь уже получены при аутентификации
+    return request.auth is not None and str(request.auth.user_id) == str(pk)
 
 
 class LoginAPIView(APIView):
@@ -81,19 +156,36 @@ class LoginAPIView(APIView):
     """
 
     def post(self, request):
+        email = request.data.get('email')
+        ip = request.META.get('REMOTE_ADDR')
+
+        # Проверка лимита неудачных попыток до хеширования пароля
+        if login_blocked(email, ip):
+            response = JsonResponse({'Status': False, 'Error': 'Too many login attempts, try again later'},
+                                    status=429)
+            response['Retry-After'] = settings.LOGIN_RATE_WINDOW
+            return response
+
+        # Получение пользователя вместе с токеном одним запросом
+        user = User.objects.select_related('auth_token').filter(email=email).first()
 
         # Проверка наличия пользователя и корректность введенного email
-        if not User.objects.filter(email=request.data.get('email')):
+        if user is None:
+            login_failed(email, ip)
             return JsonResponse({'Status': False, 'Error': 'A user with that email does not exist'}, status=401)
 
-        # Получение пользователя
-        user = User.objects.get(email=request.data.get('email'))
-
         # Проверка корректности введенного пароля
         if not user.check_password(request.data.get('password')):
+            login_failed(email, ip)
             return JsonResponse({'Status': False, 'Error': 'Wrong password, login declined'}, status=401)
 
-        return Response({'status': 'POST-OK'})
+        login_succeeded(email)
+        try:
+            token = user.auth_token
+        except Token.DoesNotExist:
+            token, _ = Token.objects.get_or_create(user=user)
+
+        return Response({'status': 'POST-OK', 'token': token.key})
 
     def delete(self, request, pk):
         # Метод для удаления пользователя
@@ -103,7 +195,7 @@ class LoginAPIView(APIView):
             return JsonResponse({'Status': False, 'Error': 'Deletion declined. Authentication required'}, status=401)
 
         # Проверка, что пользователь хочет удалить свой аккаунт
-        if Token.objects.get(user=pk) != request.auth:
+        if not is_owner(request, pk):
             return JsonResponse({'Status': False, 'Error': 'Permission denied. Only owner can delete the account'},
                                 status=403)
         user = User.objects.get(email=request.user.email)
@@ -120,7 +212,7 @@ class LoginAPIView(APIView):
         # Метод для изменения статуса дистрибутора
 
         # Проверка, что пользователь изменяет статус своего аккаунта
-        if Token.objects.get(user=pk) != request.auth:
+        if not is_owner(request, pk):
             return JsonResponse({'Status': False, 'Error': 'Permission denied. Only owner can update the account data'},
                                 status=403)
 
@@ -131,26 +223,125 @@ class LoginAPIView(APIView):
         return Response({'status': 'PATCH-OK'})
 
 
+# тип результата агрегатов по денежным полям
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def catalog_state(request):
+    # время последнего изменения товаров (по индексу modified) и версия каталога из кеша,
+    # вычисляются один раз на запрос
+    if not hasattr(request, 'catalog_state'):
+        request.catalog_state = dict(Product.objects.aggregate(modified=Max('modified')),
+                                     version=get_catalog_version())
+    return request.catalog_state
+
+
+def catalog_etag(request):
+    state = catalog_state(request)
+    if state['modified'] is None:
+        return None
+    return _etag(state['modified'].isoformat(), state['version'], request.META.get('QUERY_STRING', ''))
+
+
+def catalog_last_modified(request):
+    return catalog_state(request)['modified']
+
+
+def product_modified(request, pk=None):
+    # время изменения товара, вычисляется один раз на запрос
+    if not hasattr(request, 'product_modified'):
+        request.product_modified = Product.objects.filter(pk=pk).values_list('modified', flat=True).first() \
+            if str(pk).isdigit() else None
+    return request.product_modified
+
+
+def product_etag(request, pk=None):
+    modified = product_modified(request, pk)
+    if modified is None:
+        return None
+    return _etag(pk, modified.isoformat(), request.META.get('QUERY_STRING', ''))
+
+
+def _etag(*parts):
+    return hashlib.blake2b(':'.join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+
 class ProductViewSet(viewsets.ViewSet):
     """
     Класс для представления товаров
+    Список выводится с курсорной пагинацией, параметр ?fields=id,name ограничивает набор полей,
+    параметры фильтрации и фасетов описаны в goods.filters.
+    Ответы содержат ETag и Last-Modified, повторный запрос с If-None-Match / If-Modified-Since
+    при неизменном каталоге получает 304 без выборки и сериализации товаров
     """
-    def list(self, request):
-        queryset = Product.objects.all()
-        serializer = ProductParameterSerializer(queryset, many=True)
-        return Response(serializer.data)
+    pagination_class = ProductCursorPagination
 
-    def retrieve(self, request, pk=None):
+    @staticmethod
+    def get_fields(request):
+        """
+        Получение списка запрошенных полей из параметра ?fields=
+        :return: list или None, если выводятся все поля
+        """
+        fields = request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        if set(fields) - set(ProductParameterSerializer.Meta.fields):
+            raise ValidationError({'fields': f'Available fields: {", ".join(ProductParameterSerializer.Meta.fields)}'})
+        return fields
+
+    @staticmethod
+    def get_queryset(fields=None):
+        # предложения и параметры товаров подгружаются двумя запросами на весь список, а не на каждый товар;
+        # вложенные данные, не попавшие в ?fields=, не запрашиваются совсем
         queryset = Product.objects.all()
-        product = get_object_or_404(queryset, pk=pk)
-        serializer = ProductParameterSerializer(product)
-        return Response(serializer.data)
+        if fields is None or 'product_distributors' in fields:
+            queryset = queryset.prefetch_related('product_distributors')
+        if fields is None or 'prod_parameters' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('prod_parameters', queryset=ProductParameter.objects.select_related('parameter_name')))
+        return queryset
+
+    @method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified))
+    def list(self, request):
+        fields = self.get_fields(request)
+        queryset = filter_products(self.get_queryset(fields), request.query_params)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = ProductParameterSerializer(page, many=True, fields=fields)
+        response = paginator.get_paginated_response(serializer.data)
+        if request.query_params.get('facets'):
+            response.data['facets'] = get_facets(queryset)
+        return response
+
+    @method_decorator(condition(etag_func=product_etag, last_modified_func=product_modified))
+    def retrieve(self, request, pk=None):
+        fields = self.get_fields(request)
+        if not str(pk).isdigit():
+            raise Http404
+
+        # карточка сериализуется только при промахе кеша, см. goods.cache
+        def render():
+            product = get_object_or_404(self.get_queryset(fields), pk=pk)
+            return ProductParameterSerializer(product, fields=fields).data
+
+        return Response(get_product_payload(int(pk), product_modified(request, pk), fields, render))
+
+    @action(detail=False, methods=['get'], url_path='cache')
+    def cache_stats(self, request):
+        # счетчики кеша карточек товаров, только для персонала
+
+        if not request.user.is_staff:
+            return JsonResponse({'Status': False, 'Error': 'Only for staff'}, status=403)
+
+        return Response(get_cache_stats())
 
 
 class RegisterAPIView(APIView):
     """
     Класс для регистрации нового пользователя (создание аккаунта)
     """
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         user_obj = request.data
 
@@ -194,7 +385,7 @@ class RegisterAPIView(APIView):
         subject = f'Подтверждение регистрации'
         from_email = EMAIL_HOST_USER
         recipient_list = [user_obj.get('email')]
-        send_mail(subject, message, from_email, recipient_list)  # непосредственно отправка email
+        queue_mail(subject, message, from_email, recipient_list)  # письмо уходит после фиксации транзакции
 
         return Response({'status': 'POST-OK'})
 
@@ -204,9 +395,56 @@ class BasketViewSet(viewsets.ModelViewSet):
     ViewSet для работы с корзиной
     Реализованы методы GET, POST, PATCH, DELETE
     """
-    queryset = Basket.objects.all()
+    queryset = Basket.objects.select_related('offer__product', 'offer__distributor__user')
     serializer_class = BasketSerializer
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Пакетное добавление строк в корзину: [{"product": ..., "distributor": ..., "quantity": ...}, ...]
+        Предложения для всех строк проверяются одним запросом, корректные строки записываются
+        через bulk_create, в ответе - результат по каждой строке
+        """
+        lines = request.data
+        if not isinstance(lines, list) or not lines:
+            return JsonResponse({'Status': False, 'Error': 'A list of basket lines is required'}, status=400)
+        if len(lines) > settings.BASKET_BULK_MAX_LINES:
+            return JsonResponse({'Status': False, 'Error': f'Max {settings.BASKET_BULK_MAX_LINES} lines per request'},
+                                status=400)
+
+        # проверка полей строк без запросов к БД
+        results, valid = [{'line': index} for index in range(len(lines))], []
+        for index, line in enumerate(lines):
+            serializer = BasketLineSerializer(data=line)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index]['errors'] = serializer.errors
+
+        baskets = []
+        for (index, _), result in zip(valid, build_basket_lines([line for _, line in valid])):
+            if isinstance(result, Basket):
+                baskets.append((index, result))
+            else:
+                results[index]['errors'] = result.detail
+        if not baskets:
+            return Response({'Status': False, 'Error': 'No valid basket lines', 'lines': results}, status=400)
+        Basket.objects.bulk_create([basket for _, basket in baskets])
+
+        for index, basket in baskets:
+            results[index].update(BasketSerializer(basket).data)
+        return Response({'status': 'POST-OK', 'created': len(baskets), 'lines': results}, status=201)
+
+    @action(detail=False, methods=['get'])
+    def totals(self, request):
+        # итоги корзины считаются в БД одним агрегирующим запросом
+        return Response(self.get_queryset().aggregate(
+            lines=Count('id'),
+            items=Coalesce(Sum('quantity'), 0),
+            sum=Coalesce(Sum(F('price') * F('quantity'), output_field=MONEY), Value(0, output_field=MONEY)),
+            total=Coalesce(Sum('total_price'), Value(0, output_field=MONEY)),
+        ))
+
 
 class OrderConfirmationViewSet(viewsets.ModelViewSet):
     """
@@ -216,74 +454,76 @@ class OrderConfirmationViewSet(viewsets.ModelViewSet):
     serializer_class = OrderConfirmationSerializer
 
 
+# строки заказа вместе с заказом, покупателем и адресом; заказ без строк читается из ORDERS
+ORDER_LINES = OrderLine.objects.select_related('order__basket', 'order__order_confirmation__address')
+ORDERS = OrderMeta.objects.select_related('basket', 'order_confirmation__address')
+
+
+def order_etag(order):
+    # строки заказа не меняются, поэтому ETag зависит только от статуса
+    return f'"{_etag(order.id, order.status, order.total_price)}"'
+
+
+def order_context(order, order_lines):
+    """
+    Данные заказа для вывода
+    :param order: OrderMeta с загруженным order_confirmation
+    :param order_lines: list - OrderLine заказа
+    :return: dict
+    """
+    confirmation = order.order_confirmation
+    return {
+        'order_number': order.id,
+        'date': order.date,
+        'status': order.status,
+        'lines': [{
+            'product': line.product,
+            'distributor': line.distributor,
+            'price': line.price,
+            'quantity': line.quantity,
+            'sum': line.sum,
+        } for line in order_lines],
+        'total_price': order.total_price,
+        'customer': f'{confirmation.last_name} {confirmation.first_name} {confirmation.middle_name}',
+        'email': confirmation.email,
+        'phone': confirmation.phone,
+    }
+
+
 class OrderAPIView(APIView):
     """
     Представление для вывода сформированного заказа
+    Только чтение: письма о заказе ставятся в очередь при оформлении и смене статуса (goods.notifications)
     """
     def get(self, request, pk):
         """
         Метод для получения заказа, pk -> id из модели OrderMeta
+        Строки заказа вместе с заказом, покупателем и адресом читаются одним запросом
         :param request: Request
         :param pk: int
         :return: Response
         """
-        order = OrderMeta.objects.get(id=pk)
-        confirmation = order.order_confirmation
-        basket = order.basket
-        context = {
-            'order_number': order.id,
-            'date': order.date,
-            'status': order.status,
-            'product': basket.product,
-            'distributor': basket.distributor,
-            'price': basket.price,
-            'quantity': basket.quantity,
-            'sum': basket.sum,
-            'customer': f'{confirmation.last_name} {confirmation.first_name} {confirmation.middle_name}',
-            'email': confirmation.email,
-            'phone': confirmation.phone,
-        }
-
-        # Параметры для отправки email с параметрами заказа для клиента
-        message = f"Спасибо за заказ \n" \
-                  f"Параметры заказа:\n" \
-                  f"Номер заказа - {order.id}\n" \
-                  f"Ваш заказ - {order.basket.product} \n" \
-                  f"Поставщик - {order.basket.distributor} \n" \
-                  f"Количество - {order.basket.price} \n" \
-                  f"Итоговая цена - {order.basket.sum}"
-        subject = f'Ваш заказ № {order.id} принят'
-        from_email = EMAIL_HOST_USER
-        recipient_list = [confirmation.email]
-        send_mail(subject, message, from_email, recipient_list)  # отправка email клиенту
-
-        # Рассылка нового заказа на почту администратора
-        message_to_admin = f"Поступил новый заказ \n" \
-                           f"Параметры заказа: \n" \
-                           f"Номер заказа - № {order.id} \n" \
-                           f"Наименование товара - {order.basket.product} \n" \
-                           f"Поставщик - {order.basket.distributor}\n" \
-                           f"Покупатель - {confirmation.last_name} {confirmation.first_name} " \
-                           f"{confirmation.middle_name} \n" \
-                           f"Количество - {order.basket.price} \n" \
-                           f"Итоговая цена - {order.basket.sum} \n" \
-                           f"Адрес - {confirmation.address.city} {confirmation.address.street}, " \
-                           f"building - {confirmation.address.building}, office - {confirmation.address.office}"
-
-        subject_to_admin = f'Новый заказ № {order.id}'
-        from_email = EMAIL_HOST_USER
-        admin_email = User.objects.filter(is_superuser=True).first().email
-        recipient_list = [admin_email]
-        send_mail(subject_to_admin, message_to_admin, from_email, recipient_list)  # отправка email админу
+        if not str(pk).isdigit():
+            raise Http404
+        order_lines = list(ORDER_LINES.filter(order=pk))
+        order = order_lines[0].order if order_lines else get_object_or_404(ORDERS, pk=pk)
 
-        return Response(data=context, status=200)
+        etag = order_etag(order)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        response = Response(data=order_context(order, order_lines), status=200)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 
 class OrderMetaViewSet(viewsets.ModelViewSet):
     """
     Представление для отображения заказов
     """
-    queryset = OrderMeta.objects.all()
+    queryset = OrderMeta.objects.select_related('basket').prefetch_related('lines')
     serializer_class = OrderMetaSerializer
 
 
@@ -301,3 +541,9 @@ class OrderHistoryViewSet(viewsets.ModelViewSet):
     """
     queryset = OrderHistory.objects.all()
     serializer_class = OrderHistorySerializer
+
+    @action(detail=False, methods=['get'])
+    def totals(self, request):
+        # количество и сумма закрытых заказов по статусам одним агрегирующим запросом
+        return Response(list(self.get_queryset().order_by('order_confirmation').values('order_confirmation').annotate(
+            orders=Count('id'), result_price=Sum('result_price'))))
@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "orders.settings")
 
 application = get_asgi_application()
+
+# под ASGI синхронный код выполняется в потоках sync_to_async, и постоянное соединение потока
+# не закрывается в конце запроса: соединения переиспользуются только через пул (DB_POOL_SIZE > 0)
+# или открываются на каждый запрос (DB_CONN_MAX_AGE = 0)
+for alias, database in settings.DATABASES.items():
+    if database.get('CONN_MAX_AGE', 0) != 0 and database['ENGINE'] != 'orders.db_pool':
+        raise ImproperlyConfigured(f'Database {alias!r}: persistent connections under ASGI require '
+                                   f'DB_POOL_SIZE > 0 or DB_CONN_MAX_AGE = 0')
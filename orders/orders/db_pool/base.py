@@ -0,0 +1,165 @@
+"""
+Бэкенд PostgreSQL с пулом соединений процесса
+
+Соединение Django при закрытии (в конце запроса, CONN_MAX_AGE = 0) не разрывается, а возвращается
+в общий пул процесса, и следующий запрос любого потока получает его без TCP-соединения и
+аутентификации. Постоянные соединения Django (CONN_MAX_AGE > 0) привязаны к потоку, а под ASGI
+каждый запрос выполняется в новом потоке, поэтому там переиспользование дает только пул.
+
+Настройки - DATABASES[...]['OPTIONS']['pool']: {'max_size': 10, 'timeout': 30, 'check_idle': 30},
+где check_idle - через сколько секунд простоя соединение проверяется запросом SELECT 1 перед выдачей.
+"""
+import threading
+import time
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+from psycopg2 import extensions
+
+
+class ConnectionPool:
+    """
+    Пул соединений psycopg2: свободные соединения выдаются в порядке LIFO, чтобы лишние
+    простаивали и проверялись реже; при исчерпании пула ожидание не дольше timeout секунд
+    """
+    def __init__(self, max_size=10, timeout=30, check_idle=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.size = 0
+        self.created = 0
+        self.closed = False
+        self.idle = []
+        self.condition = threading.Condition()
+
+    def acquire(self, connect):
+        """
+        Свободное соединение из пула или новое, созданное connect()
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.condition:
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise OperationalError(f'No free database connection in the pool in {self.timeout}s')
+                    self.condition.wait(remaining)
+                if not self.idle:
+                    self.size += 1
+                    break
+                connection, released = self.idle.pop()
+
+            # проверка выполняется вне блокировки, чтобы не задерживать другие потоки
+            if self._usable(connection, released):
+                return connection
+            self._discard(connection)
+
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.created += 1
+        return connection
+
+    def release(self, connection):
+        """
+        Возврат соединения в пул. Незавершенная транзакция откатывается, разорванное соединение закрывается
+        """
+        status = connection.info.transaction_status if not connection.closed else None
+        if self.closed or status in (None, extensions.TRANSACTION_STATUS_UNKNOWN):
+            self._discard(connection)
+            return
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except Exception:
+                self._discard(connection)
+                return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def close(self):
+        """
+        Закрытие свободных соединений; выданные соединения закрываются при возврате в пул
+        """
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _usable(self, connection, released):
+        if connection.closed:
+            return False
+        if time.monotonic() - released < self.check_idle:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_dict):
+    """
+    Пул соединений процесса для базы из settings_dict, создается при первом обращении.
+    Пулы различаются по базе, а не по псевдониму: при запуске тестов псевдоним переключается на тестовую базу
+    """
+    key = tuple(settings_dict[name] for name in ('NAME', 'HOST', 'PORT', 'USER'))
+    with _pools_lock:
+        if key not in _pools or _pools[key].closed:
+            _pools[key] = ConnectionPool(**settings_dict['OPTIONS'].get('pool', {}))
+        return _pools[key]
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # пока в пуле есть соединения с тестовой базой, удалить ее нельзя
+        self.connection.pool.close()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        return get_pool(self.settings_dict)
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # при выдаче соединения из пула базовый метод не вызывается, уровень изоляции задается здесь
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', base.IsolationLevel.READ_COMMITTED))
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
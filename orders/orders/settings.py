@@ -81,14 +81,32 @@ WSGI_APPLICATION = "orders.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Соединения с PostgreSQL: время жизни постоянного соединения в секундах (0 - новое соединение на каждый
+# запрос) и проверка постоянного соединения перед использованием в новом запросе.
+# Постоянные соединения привязаны к потоку, поэтому под ASGI (orders.asgi) нужен пул (DB_POOL_SIZE)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_CONN_HEALTH_CHECKS = bool(int(os.getenv('DB_CONN_HEALTH_CHECKS', 1)))
+
+# Пул соединений процесса (orders.db_pool): максимальное количество соединений, 0 - без пула.
+# С пулом соединение возвращается в пул в конце каждого запроса; под ASGI включать пул вместо DB_CONN_MAX_AGE
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+# Пул соединений: ожидание свободного соединения и простой, после которого соединение проверяется, в секундах
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_CHECK_IDLE = int(os.getenv('DB_POOL_CHECK_IDLE', 30))
+
 DATABASES = {
     "default": {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'orders.db_pool' if DB_POOL_SIZE else 'django.db.backends.postgresql',
         'NAME': 'diploma_db_test',
         'HOST': '127.0.0.1',
         'PORT': '5431',
         'USER': 'user',
         'PASSWORD': os.getenv('PG_PASSWORD'),
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        'OPTIONS': {
+            'pool': {'max_size': DB_POOL_SIZE, 'timeout': DB_POOL_TIMEOUT, 'check_idle': DB_POOL_CHECK_IDLE},
+        } if DB_POOL_SIZE else {},
     }
 }
 
@@ -124,6 +142,10 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Загруженные файлы (прайсы для фонового импорта)
+
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -131,8 +153,10 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'goods.authentication.CachedTokenAuthentication',
+    ],
+    # денежные поля (DecimalField) выводятся в JSON числами, как и до перехода с FloatField
+    'COERCE_DECIMAL_TO_STRING': False,
 }
 
 EMAIL_HOST = os.getenv('EMAIL_HOST')
@@ -140,6 +164,69 @@ EMAIL_PORT = os.getenv('EMAIL_PORT')
 EMAIL_USE_SSL = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+# ожидание SMTP-сервера в секундах, чтобы недоступный сервер не останавливал обработчик очереди писем
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 30))
 
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Список товаров: размер страницы по умолчанию и максимальный размер, задаваемый ?page_size=
+PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', 50))
+PRODUCTS_MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 500))
+
+# Импорт прайс-листов: количество позиций, обрабатываемых за один пакет
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 2000))
+
+# Импорт прайс-листов: количество процессов для проверки и нормализации позиций (1 - без пула процессов)
+IMPORT_PROCESS_WORKERS = int(os.getenv('IMPORT_PROCESS_WORKERS', 1))
+
+# Выгрузка каталога: количество предложений, читаемых из БД за один раз
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
+# Фоновый импорт: количество потоков веб-процесса для задач ImportJob,
+# 0 - задачи выполняет только manage.py process_import_jobs
+IMPORT_JOB_WORKERS = int(os.getenv('IMPORT_JOB_WORKERS', 2))
+
+# Кеш: по умолчанию в памяти процесса; для общего кеша нескольких процессов без внешних сервисов
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache и CACHE_LOCATION=<каталог>
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'orders'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
+# Кеш карточек товаров: время жизни записи в секундах
+PRODUCT_CACHE_TIMEOUT = int(os.getenv('PRODUCT_CACHE_TIMEOUT', 3600))
+
+# Пакетное добавление в корзину: максимальное количество строк в одном запросе
+BASKET_BULK_MAX_LINES = int(os.getenv('BASKET_BULK_MAX_LINES', 1000))
+
+# Очередь исходящих писем: количество потоков веб-процесса для отправки после фиксации транзакции,
+# 0 - письма отправляет только manage.py send_queued_mail
+EMAIL_OUTBOX_WORKERS = int(os.getenv('EMAIL_OUTBOX_WORKERS', 1))
+
+# Очередь исходящих писем: количество писем, отправляемых через одно SMTP-соединение
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 100))
+
+# Очередь исходящих писем: число попыток и задержка перед повтором в секундах (удваивается с каждой попыткой)
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_DELAY', 60))
+
+# Кеш токенов аутентификации в памяти процесса (goods.authentication): количество токенов (0 - без кеша)
+# и время жизни записи в секундах - за это время становятся видны изменения, сделанные другими процессами
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 300))
+
+# Вход: количество неудачных попыток для учетной записи и для IP-адреса за LOGIN_RATE_WINDOW секунд,
+# после которого вход отклоняется с кодом 429 до конца этого периода
+LOGIN_ACCOUNT_ATTEMPTS = int(os.getenv('LOGIN_ACCOUNT_ATTEMPTS', 5))
+LOGIN_IP_ATTEMPTS = int(os.getenv('LOGIN_IP_ATTEMPTS', 20))
+LOGIN_RATE_WINDOW = int(os.getenv('LOGIN_RATE_WINDOW', 300))
+
+# Асинхронные представления для списка и карточки товара, корзины и заказа (goods.async_views),
+# включать при запуске под ASGI (orders.asgi)
+ASYNC_VIEWS = bool(int(os.getenv('ASYNC_VIEWS', 0)))
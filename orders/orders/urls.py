@@ -14,9 +14,10 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from goods.views import PartnerUpdate, LoginAPIView, RegisterAPIView, ProductViewSet, BasketViewSet, \
+from goods.views import PartnerUpdate, ImportJobAPIView, LoginAPIView, RegisterAPIView, ProductViewSet, BasketViewSet, \
     OrderConfirmationViewSet, OrderAPIView, OrderMetaViewSet, OrderChangeStatusViewSet, OrderHistoryViewSet
 from rest_framework.routers import DefaultRouter
 
@@ -32,6 +33,7 @@ router.register(r'order_history', OrderHistoryViewSet, basename='order_history')
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('export/', PartnerUpdate.as_view()),
+    path('export/jobs/<int:pk>/', ImportJobAPIView.as_view()),
     path('entry/', LoginAPIView.as_view()),
     path('entry/<pk>/', LoginAPIView.as_view()),
     path('register/', RegisterAPIView.as_view()),
@@ -39,3 +41,8 @@ urlpatterns = [
 
 
 ] + router.urls
+
+if settings.ASYNC_VIEWS:
+    # под ASGI часто вызываемые GET-запросы обслуживают асинхронные представления
+    from goods.async_views import urlpatterns as async_urlpatterns
+    urlpatterns = async_urlpatterns + urlpatterns